@@ -1,13 +1,17 @@
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import pytz
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.momentumpanel import build_panel, run_momentum_panel
+
 # Load environment
 load_dotenv()
 API_KEY = os.getenv("APCA_API_KEY_ID")
@@ -16,6 +20,7 @@ TICKERS = os.getenv("TICKERS", "").split(",")
 
 # Alpaca Historical Client
 client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(client)
 
 # Backtest parameters
 START_DATE = datetime(2024, 5, 1, tzinfo=pytz.UTC)
@@ -23,26 +28,17 @@ END_DATE = datetime(2024, 5, 15, tzinfo=pytz.UTC)
 POSITION_SIZE = 200      # dollars per trade
 MOMENTUM_THRESHOLD = 0.1  # in %
 COOLDOWN_MINUTES = 10
+BACKTEST_MODE = os.getenv("BACKTEST_MODE", "panel")  # "panel": all tickers in one matrix; "ticker": one loop per ticker
 
 def backtest(symbol):
     print(f"\n--- Backtesting {symbol} ---")
     
-    # Request minute-level data
-    request_params = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=START_DATE,
-        end=END_DATE,
-    )
-
-    bars = client.get_stock_bars(request_params).df
-    if bars.empty:
+    # Minute-level data, served from the local bar store when already downloaded
+    df = bar_cache.get_bars(symbol, START_DATE, END_DATE, TimeFrame.Minute, feed=None)
+    if df.empty:
         print("No data for", symbol)
         return
 
-    # Isolate the data for our symbol and sort by time if needed
-    df = bars.xs(symbol, level=0).sort_index()
-
     # Initialize simulation variables
     cash = 10000.0
     position = 0
@@ -99,6 +95,52 @@ def backtest(symbol):
     plt.tight_layout()
     plt.show()
 
-# Run backtest for each ticker
-for ticker in TICKERS:
-    backtest(ticker)
\ No newline at end of file
+def backtest_panel(symbols):
+    """All symbols at once: one timestamp x symbol close matrix, one scan, one equity matrix."""
+    prices_by_symbol = {}
+    for symbol in symbols:
+        df = bar_cache.get_bars(symbol, START_DATE, END_DATE, TimeFrame.Minute, feed=None)
+        if df.empty:
+            print(f"\n--- Backtesting {symbol} ---")
+            print("No data for", symbol)
+            continue
+        prices_by_symbol[symbol] = df
+    if not prices_by_symbol:
+        return
+
+    panel = build_panel(prices_by_symbol)
+    equity, trades = run_momentum_panel(panel, POSITION_SIZE, MOMENTUM_THRESHOLD, COOLDOWN_MINUTES)
+
+    trades_by_symbol = dict(tuple(trades.groupby("symbol", sort=False)))
+    for symbol in equity.columns:
+        print(f"\n--- Backtesting {symbol} ---")
+        curve = equity[symbol].dropna()
+        if curve.empty:
+            print(f"Not enough data for {symbol}")
+            continue
+        symbol_trades = trades_by_symbol.get(symbol, trades.iloc[:0])
+        print(f"Final portfolio value for {symbol}: ${curve.iloc[-1]:.2f}")
+        print(f"Number of trades: {len(symbol_trades)}")
+        for t in symbol_trades.itertuples(index=False):
+            print(f"{t.time} | {t.action} | ${t.price:.2f} | {t.shares} shares")
+
+    # Plot every equity curve from the matrix in one chart
+    plt.figure(figsize=(10, 5))
+    for symbol in equity.columns:
+        curve = equity[symbol].dropna()
+        plt.plot(curve.index, curve.values, label=f'{symbol} Portfolio Value')
+    plt.xlabel('Time')
+    plt.ylabel('Portfolio Value ($)')
+    plt.title('Equity Curves')
+    if len(equity.columns) <= 20:
+        plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
+
+if BACKTEST_MODE == "panel":
+    backtest_panel(TICKERS)
+else:
+    # Run backtest for each ticker
+    for ticker in TICKERS:
+        backtest(ticker)
@@ -1,13 +1,17 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pytz
 from alpaca_trade_api.rest import REST
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batchfetch import fetch_bars_batch
+from common.brokersnapshot import BrokerSnapshot
+
 # Load .env variables
 load_dotenv()
 
@@ -15,11 +19,12 @@ load_dotenv()
 API_KEY = os.getenv("APCA_API_KEY_ID")
 SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL")
-TICKERS = os.getenv("TICKERS", "").split(",")
+TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
 
 # Alpaca clients
 client = REST(API_KEY, SECRET_KEY, BASE_URL)
-data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY, raw_data=True)  # bars are decoded straight into columns
+broker = BrokerSnapshot(client)
 
 # Strategy parameters
 MOMENTUM_THRESHOLD = 0.15  # in %
@@ -31,74 +36,27 @@ LOOKBACK_MINUTES_2 = 3
 last_buy_time = {}
 
 
-def get_price_data(symbol):
+def get_price_data(symbols):
     end = datetime.utcnow()
     start = end - timedelta(minutes=LOOKBACK_MINUTES)
     start_2 = end - timedelta(minutes=LOOKBACK_MINUTES_2)
 
-    request_params = StockBarsRequest(
-        symbol_or_symbols=[symbol],
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="iex",
-    )
-    request_params2 = StockBarsRequest(
-        symbol_or_symbols=[symbol],
-        timeframe=TimeFrame.Minute,
-        start=start_2,
-        end=end,
-        feed="iex",
-    )
-
     try:
-        bars = data_client.get_stock_bars(request_params).data[symbol]
-        bars2 = data_client.get_stock_bars(request_params2).data[symbol]
-
-        if not bars2:
-            print(f"No data returned for {symbol}")
-            return pd.DataFrame()
-
-        if not bars:
-            print(f"No data returned for {symbol}")
-            return pd.DataFrame()
-
-        # Convert to DataFrame
-        df = pd.DataFrame(
-            [
-                {
-                    "timestamp": bar.timestamp.replace(tzinfo=pytz.utc).astimezone(
-                        pytz.timezone("America/New_York")
-                    ),
-                    "open": bar.open,
-                    "high": bar.high,
-                    "low": bar.low,
-                    "close": bar.close,
-                    "volume": bar.volume,
-                }
-                for bar in bars
-            ]
-        )
-        df2 = pd.DataFrame(
-            [
-                {
-                    "timestamp": bar.timestamp.replace(tzinfo=pytz.utc).astimezone(
-                        pytz.timezone("America/New_York")
-                    ),
-                    "open": bar.open,
-                    "high": bar.high,
-                    "low": bar.low,
-                    "close": bar.close,
-                    "volume": bar.volume,
-                }
-                for bar in bars2
-            ]
+        # One batched request covering the longer window; the shorter one is sliced from it
+        bars = fetch_bars_batch(
+            data_client, symbols, start_2, end, TimeFrame.Minute, feed="iex", tz="America/New_York"
         )
-        return df, df2
-
     except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
-        return pd.DataFrame(), pd.DataFrame()  
+        print(f"Error fetching data for {', '.join(symbols)}: {e}")
+        return {}
+
+    cutoff = pytz.utc.localize(start)
+    price_data = {}
+    for symbol, bars2 in bars.items():
+        df2 = bars2.reset_index()[["timestamp", "open", "high", "low", "close", "volume"]]
+        df = df2[df2["timestamp"] >= cutoff].reset_index(drop=True)
+        price_data[symbol] = (df, df2)
+    return price_data
 
 
 
@@ -114,11 +72,7 @@ def calculate_momentum(df, df2):
 
 
 def get_position(symbol):
-    try:
-        position = client.get_position(symbol)
-        return float(position.qty)
-    except:
-        return 0.0
+    return broker.qty(symbol)
 
 
 def place_order(symbol, side, qty):
@@ -130,10 +84,17 @@ def place_order(symbol, side, qty):
 
 def run_strategy():
     current_time = datetime.now(pytz.utc)
+    try:
+        # One positions call for the whole cycle instead of one per ticker
+        broker.refresh_if_stale()
+    except Exception as e:
+        print(f"Error loading account positions: {e}")
+        return
+    price_data = get_price_data(TICKERS)
 
     for symbol in TICKERS:
         print(f"\nChecking {symbol}...")
-        df, df2 = get_price_data(symbol)
+        df, df2 = price_data.get(symbol, (pd.DataFrame(), pd.DataFrame()))
         if df.empty or df2.empty:
             print(f"No data returned for {symbol}")
             continue
@@ -1,13 +1,17 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pytz
 from alpaca_trade_api.rest import REST
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batchfetch import fetch_bars_batch
+from common.brokersnapshot import BrokerSnapshot
+
 # Load .env variables
 load_dotenv()
 
@@ -15,11 +19,12 @@ load_dotenv()
 API_KEY = os.getenv("APCA_API_KEY_ID")
 SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL")
-TICKERS = os.getenv("TICKERS", "").split(",")
+TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
 
 # Alpaca clients
 client = REST(API_KEY, SECRET_KEY, BASE_URL)
-data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY, raw_data=True)  # bars are decoded straight into columns
+broker = BrokerSnapshot(client)
 
 # Strategy parameters
 MOMENTUM_THRESHOLD = 0.15  # in %
@@ -31,44 +36,23 @@ SMA_FAST_WINDOW = 8
 SMA_SLOW_WINDOW = 18
 LOOKBACK_MINUTES = 20  # bar data range
 
-def get_price_data(symbol):
+def get_price_data(symbols):
     end = datetime.utcnow()
     start = end - timedelta(minutes=LOOKBACK_MINUTES)
 
-    request_params = StockBarsRequest(
-        symbol_or_symbols=[symbol],
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="iex",
-    )
-
     try:
-        bars = data_client.get_stock_bars(request_params).data[symbol]
-        if not bars:
-            print(f"No data returned for {symbol}")
-            return pd.DataFrame()
-
-        df = pd.DataFrame(
-            [
-                {
-                    "timestamp": bar.timestamp.replace(tzinfo=pytz.utc).astimezone(
-                        pytz.timezone("America/New_York")
-                    ),
-                    "open": bar.open,
-                    "high": bar.high,
-                    "low": bar.low,
-                    "close": bar.close,
-                    "volume": bar.volume,
-                }
-                for bar in bars
-            ]
+        # One batched request for every symbol, timestamps converted once
+        bars = fetch_bars_batch(
+            data_client, symbols, start, end, TimeFrame.Minute, feed="iex", tz="America/New_York"
         )
-        return df
-
     except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
-        return pd.DataFrame()
+        print(f"Error fetching data for {', '.join(symbols)}: {e}")
+        return {}
+
+    return {
+        symbol: df.reset_index()[["timestamp", "open", "high", "low", "close", "volume"]]
+        for symbol, df in bars.items()
+    }
 
 
 def calculate_sma_momentum(df):
@@ -86,34 +70,16 @@ def calculate_sma_momentum(df):
 
 
 def get_position(symbol):
-    try:
-        position = client.get_position(symbol)
-        return float(position.qty)
-    except:
-        return 0.0
+    return broker.qty(symbol)
 
 
 def get_entry_price(symbol):
-    try:
-        position = client.get_position(symbol)
-        return float(position.avg_entry_price)
-    except:
-        return None
+    return broker.entry_price(symbol)
 
 
 def get_last_buy_time(symbol):
-    try:
-        orders = client.list_orders(
-            status="filled",
-            limit=10,
-            direction="desc"
-        )
-        for order in orders:
-            if order.symbol == symbol and order.side == "buy":
-                return order.filled_at.replace(tzinfo=pytz.utc)
-    except Exception as e:
-        print(f"Error getting last buy time for {symbol}: {e}")
-    return None
+    # The filled-orders list is fetched once per cycle, on first use
+    return broker.last_buy_time(symbol)
 
 
 def place_order(symbol, side, qty):
@@ -125,11 +91,19 @@ def place_order(symbol, side, qty):
 
 def run_strategy():
     current_time = datetime.now(pytz.utc)
+    try:
+        # One positions call for the whole cycle instead of one per ticker
+        broker.refresh_if_stale()
+    except Exception as e:
+        print(f"Error loading account positions: {e}")
+        return
+    price_data = get_price_data(TICKERS)
 
     for symbol in TICKERS:
         print(f"\nChecking {symbol}...")
-        df = get_price_data(symbol)
-        if df.empty:
+        df = price_data.get(symbol)
+        if df is None or df.empty:
+            print(f"No data returned for {symbol}")
             continue
 
         momentum, latest_close, sma_fast, sma_slow = calculate_sma_momentum(df)
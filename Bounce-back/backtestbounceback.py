@@ -1,25 +1,23 @@
 import os
-import polars as pd
-# import pandas as pd
+import sys
+import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.bouncebackengine import BouncebackParams, BouncebackFeatures, run_bounceback_backtest
+from common.bouncebackstrategy import BouncebackStrategy, compare_results, run_replay
+from common.parallelrunner import run_tickers
+
 #Initialize some variables
 eastern = pytz.timezone('US/Eastern')
 
-def is_market_hours(dt):
-    dt_local = dt.astimezone(eastern)
-    is_weekday = dt_local.weekday() < 5  # Monday–Friday
-    market_open = dt_local.replace(hour=9, minute=30, second=0, microsecond=0)
-    market_close = dt_local.replace(hour=16, minute=0, second=0, microsecond=0)
-    return is_weekday and market_open <= dt_local <= market_close
-
 # Load credentials
 load_dotenv()
 API_KEY = os.getenv("APCA_API_KEY_ID")
@@ -27,6 +25,12 @@ SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
 TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
 
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
+
+# "vectorized" runs the array engine; "replay" feeds bars one at a time through
+# the same strategy core as the live stream bots, read with the engine's one-bar
+# indicator lag; "compare" runs both and reports any difference
+BACKTEST_ENGINE = os.getenv("BACKTEST_ENGINE", "vectorized")
 
 # Parameters
 STARTING_CASH = 1000
@@ -41,96 +45,29 @@ COOLDOWN_HOURS_AFTER_STOP = 4
 START_DATE = datetime(2024, 7, 1, tzinfo=pytz.UTC)
 END_DATE = datetime(2025, 7, 1, tzinfo=pytz.UTC)
 
+PARAMS = BouncebackParams(
+    starting_cash=STARTING_CASH,
+    position_size=POSITION_SIZE,
+    drop_pct=DROP_PCT,
+    take_profit_pct=TAKE_PROFIT_PCT,
+    stop_loss_pct=STOP_LOSS_PCT,
+    hold_hours_max=HOLD_HOURS_MAX,
+    drop_lookback_bars=DROP_LOOKBACK_BARS,
+    cooldown_minutes=COOLDOWN_HOURS_AFTER_STOP * 60,
+)
+
 def fetch_minute_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end
-    )
-    bars = data_client.get_stock_bars(request).df
-    return bars.xs(symbol, level=0)
+    return bar_cache.get_bars(symbol, start, end, TimeFrame.Minute, feed=None)
 
 def run_backtest(prices):
-    cash = STARTING_CASH
-    position = None
-    last_stop_loss_exit_time = None
-    trades = []
-
-    for i in range(DROP_LOOKBACK_BARS + 1, len(prices)):
-        signal_candle = prices.iloc[i]  # simulate decision made based on previous candle
-        now = prices.iloc[i]                # execution happens on this candle
-        now_time = now.name
-
-        # Skip if not in market hours
-        if not is_market_hours(now_time):
-            continue    
-
-        current_price = now["close"]         # simulate buy/sell at close of this minute
-
-        if position:
-            entry_price = position["entry_price"]
-            time_held = (now_time - position["entry_time"]).total_seconds() / 3600
-            return_pct = (current_price - entry_price) / entry_price * 100
-
-            stop_loss_triggered = return_pct <= STOP_LOSS_PCT
-            take_profit_triggered = return_pct >= TAKE_PROFIT_PCT
-            time_exceeded = time_held >= HOLD_HOURS_MAX
-
-            if stop_loss_triggered or take_profit_triggered or time_exceeded:
-                shares = position["shares"]
-                cash += shares * current_price
-                trades.append({
-                    "buy_time": position["entry_time"],
-                    "buy_price": entry_price,
-                    "sell_time": now_time,
-                    "sell_price": current_price,
-                    "return_pct": return_pct
-                })
-
-                # record stop loss exit time
-                if stop_loss_triggered:
-                    last_stop_loss_exit_time = now_time
-
-                position = None
-
-        else:
-            window = prices.iloc[i - DROP_LOOKBACK_BARS - 1:i - 1]
-            max_high = window["high"].max()
-            drop_pct = (signal_candle["close"] - max_high) / max_high * 100
-            sma10 = prices["close"].rolling(10).mean().iloc[i - 1]
-            trend_ok = signal_candle["close"] > sma10
-
-            # Check cooldown
-            if last_stop_loss_exit_time:
-                cooldown_elapsed = (now_time - last_stop_loss_exit_time).total_seconds() / 3600
-                if cooldown_elapsed < COOLDOWN_HOURS_AFTER_STOP:
-                    continue  # Skip entry, still in cooldown
-
-            if drop_pct <= -DROP_PCT and trend_ok:
-                shares_to_buy = POSITION_SIZE / current_price
-                if cash >= shares_to_buy * current_price:
-                    cash -= shares_to_buy * current_price
-                    position = {
-                        "entry_time": now_time,
-                        "entry_price": current_price,
-                        "shares": shares_to_buy
-                    }
-
-    # Close any open position at the final price
-    if position:
-        final_price = prices.iloc[-1]["close"]
-        shares = position["shares"]
-        cash += shares * final_price
-        trades.append({
-            "buy_time": position["entry_time"],
-            "buy_price": position["entry_price"],
-            "sell_time": prices.iloc[-1].name,
-            "sell_price": final_price,
-            "return_pct": (final_price - position["entry_price"]) / position["entry_price"] * 100
-        })
-
-    return cash, trades
+    if BACKTEST_ENGINE == "replay":
+        return run_replay(BouncebackStrategy(PARAMS, whole_shares=False, lagged=True), prices)
+    result = run_bounceback_backtest(BouncebackFeatures(prices), PARAMS)
+    if BACKTEST_ENGINE == "compare":
+        difference = compare_results(result, run_replay(BouncebackStrategy(PARAMS, whole_shares=False, lagged=True), prices))
+        print(f"[CHECK] Replay differs from the vectorized engine: {difference}" if difference else
+              "[CHECK] Replay and vectorized engine trades match")
+    return result
 
 def plot_trades(prices, trades, ticker):
     plt.figure(figsize=(14, 6))
@@ -165,37 +102,40 @@ def plot_trades(prices, trades, ticker):
 
 
 
+def backtest_ticker(ticker):
+    prices = fetch_minute_data(ticker, START_DATE, END_DATE)
+    if prices.empty:
+        return None
+    return run_backtest(prices)
+
+
 def main():
     all_trades = []
     combined_final_value = 0
     
 
-    for TICKER in TICKERS:
+    for TICKER, result, error in run_tickers(backtest_ticker, TICKERS):
         print(f"\n=== Running Backtest for {TICKER} ===")
-        try:
-            prices = fetch_minute_data(TICKER, START_DATE, END_DATE)
-            if prices.empty:
-                print(f"No data for {TICKER}, skipping.")
-                continue
-
-            cash, trades = run_backtest(prices)
-            combined_final_value += cash
-            all_trades.extend(trades)
-
-            print(f"\n--- Backtest Result for {TICKER} ---")
-            print(f"Final Portfolio Value: ${cash:.2f}")
-            print(f"Total Trades: {len(trades)}\n")
-            for trade in trades:
-                buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
-                    f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
-                    f"Return: {trade['return_pct']:.2f}%")
-
-            # plot_trades(prices, trades, TICKER)
-
-        except Exception as e:
-            print(f"Error while processing {TICKER}: {e}")
+        if error is not None:
+            print(f"Error while processing {TICKER}: {error}")
+            continue
+        if result is None:
+            print(f"No data for {TICKER}, skipping.")
+            continue
+
+        cash, trades = result
+        combined_final_value += cash
+        all_trades.extend(trades)
+
+        print(f"\n--- Backtest Result for {TICKER} ---")
+        print(f"Final Portfolio Value: ${cash:.2f}")
+        print(f"Total Trades: {len(trades)}\n")
+        for trade in trades:
+            buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
+                f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
+                f"Return: {trade['return_pct']:.2f}%")
 
     print("\n=== TOTAL STRATEGY SUMMARY ===")
     total_trades = len(all_trades)
@@ -1,14 +1,20 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.bouncebackengine import BouncebackParams, BouncebackFeatures, run_bounceback_backtest
+from common.bouncebackstrategy import BouncebackStrategy, compare_results, run_replay
+from common.parallelrunner import run_tickers
+
 # Initialize some variables
 eastern = pytz.timezone('US/Eastern')
 
@@ -19,6 +25,12 @@ SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
 TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
 
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
+
+# "vectorized" runs the array engine; "replay" feeds bars one at a time through
+# the same strategy core as the live stream bots, read with the engine's one-bar
+# indicator lag; "compare" runs both and reports any difference
+BACKTEST_ENGINE = os.getenv("BACKTEST_ENGINE", "vectorized")
 
 # Parameters
 # Parameters tuned for $SSO
@@ -36,112 +48,33 @@ COOLDOWN_MINUTES = 60            # Cooldown after a failed trade to prevent over
 START_DATE = datetime(2025, 5, 1, tzinfo=pytz.UTC)
 END_DATE = datetime(2025, 7, 1, tzinfo=pytz.UTC)
 
-MARKET_OPEN_HOUR = 9
-MARKET_OPEN_MINUTE = 30
-MARKET_CLOSE_HOUR = 16
-MARKET_CLOSE_MINUTE = 0
+PARAMS = BouncebackParams(
+    starting_cash=STARTING_CASH,
+    position_size=POSITION_SIZE,
+    drop_pct=DROP_PCT,
+    take_profit_pct=TAKE_PROFIT_PCT,
+    stop_loss_pct=STOP_LOSS_PCT,
+    hold_hours_max=HOLD_HOURS_MAX,
+    drop_lookback_bars=DROP_LOOKBACK_BARS,
+    trailing_stop_loss_pct=TRAILING_STOP_LOSS_PCT,
+    cooldown_minutes=COOLDOWN_MINUTES,
+    require_sma20=True,
+    require_bounce=True,
+)
 
-def is_during_market_hours(dt):
-    dt_est = dt.astimezone(eastern)
-    market_open = dt_est.replace(hour=MARKET_OPEN_HOUR, minute=MARKET_OPEN_MINUTE, second=0, microsecond=0)
-    market_close = dt_est.replace(hour=MARKET_CLOSE_HOUR, minute=MARKET_CLOSE_MINUTE, second=0, microsecond=0)
-    return market_open <= dt_est <= market_close and dt_est.weekday() < 5
 
 def fetch_minute_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="sip"
-    )
-    bars = data_client.get_stock_bars(request).df
-    return bars.xs(symbol, level=0)
+    return bar_cache.get_bars(symbol, start, end, TimeFrame.Minute, feed="sip")
 
 def run_backtest(prices):
-    cash = STARTING_CASH
-    position = None
-    trades = []
-    cooldown_end_time = None
-
-    for i in range(DROP_LOOKBACK_BARS + 1, len(prices)):
-        signal_candle = prices.iloc[i]
-        now = prices.iloc[i]
-        now_time = now.name
-
-        if not is_during_market_hours(now_time):
-            continue
-
-        current_price = now["close"]
-
-        if position:
-            entry_price = position["entry_price"]
-            max_price = position["max_price_since_entry"]
-            time_held = (now_time - position["entry_time"]).total_seconds() / 3600
-            return_pct = (current_price - entry_price) / entry_price * 100
-            trailing_drop_pct = (current_price - max_price) / max_price * 100
-
-            if current_price > max_price:
-                position["max_price_since_entry"] = current_price
-                max_price = current_price
-
-            if (return_pct >= TAKE_PROFIT_PCT or
-                return_pct <= STOP_LOSS_PCT or
-                trailing_drop_pct <= TRAILING_STOP_LOSS_PCT or
-                time_held >= HOLD_HOURS_MAX):
-
-                shares = position["shares"]
-                cash += shares * current_price
-                trades.append({
-                    "buy_time": position["entry_time"],
-                    "buy_price": entry_price,
-                    "sell_time": now_time,
-                    "sell_price": current_price,
-                    "return_pct": return_pct
-                })
-                position = None
-
-                if return_pct <= STOP_LOSS_PCT:
-                    cooldown_end_time = now_time + timedelta(minutes=COOLDOWN_MINUTES)
-
-        else:
-            if cooldown_end_time and now_time < cooldown_end_time:
-                continue
-
-            window = prices.iloc[i - DROP_LOOKBACK_BARS - 1:i - 1]
-            max_high = window["high"].max()
-            drop_pct = (signal_candle["close"] - max_high) / max_high * 100
-            sma10 = prices["close"].rolling(10).mean().iloc[i - 1]
-            sma20 = prices["close"].rolling(20).mean().iloc[i - 1]
-            trend_ok = signal_candle["close"] > sma10 and sma10 > sma20
-
-            prev_candle = prices.iloc[i - 1]
-            bounce_ok = signal_candle["close"] > prev_candle["close"]
-
-            if drop_pct <= -DROP_PCT and trend_ok and bounce_ok:
-                shares_to_buy = POSITION_SIZE / current_price
-                if cash >= shares_to_buy * current_price:
-                    cash -= shares_to_buy * current_price
-                    position = {
-                        "entry_time": now_time,
-                        "entry_price": current_price,
-                        "shares": shares_to_buy,
-                        "max_price_since_entry": current_price
-                    }
-
-    if position:
-        final_price = prices.iloc[-1]["close"]
-        shares = position["shares"]
-        cash += shares * final_price
-        trades.append({
-            "buy_time": position["entry_time"],
-            "buy_price": position["entry_price"],
-            "sell_time": prices.iloc[-1].name,
-            "sell_price": final_price,
-            "return_pct": (final_price - position["entry_price"]) / position["entry_price"] * 100
-        })
-
-    return cash, trades
+    if BACKTEST_ENGINE == "replay":
+        return run_replay(BouncebackStrategy(PARAMS, whole_shares=False, lagged=True), prices)
+    result = run_bounceback_backtest(BouncebackFeatures(prices), PARAMS)
+    if BACKTEST_ENGINE == "compare":
+        difference = compare_results(result, run_replay(BouncebackStrategy(PARAMS, whole_shares=False, lagged=True), prices))
+        print(f"[CHECK] Replay differs from the vectorized engine: {difference}" if difference else
+              "[CHECK] Replay and vectorized engine trades match")
+    return result
 
 # The rest of the code (plot_trades, main, etc.) stays unchanged
 
@@ -175,36 +108,39 @@ def plot_trades(prices, trades, ticker):
     plt.tight_layout()
     plt.show()
 
+def backtest_ticker(ticker):
+    prices = fetch_minute_data(ticker, START_DATE, END_DATE)
+    if prices.empty:
+        return None
+    return run_backtest(prices)
+
+
 def main():
     all_trades = []
     combined_final_value = 0
 
-    for TICKER in TICKERS:
+    for TICKER, result, error in run_tickers(backtest_ticker, TICKERS):
         print(f"\n=== Running Backtest for {TICKER} ===")
-        try:
-            prices = fetch_minute_data(TICKER, START_DATE, END_DATE)
-            if prices.empty:
-                print(f"No data for {TICKER}, skipping.")
-                continue
-
-            cash, trades = run_backtest(prices)
-            combined_final_value += cash
-            all_trades.extend(trades)
-
-            print(f"\n--- Backtest Result for {TICKER} ---")
-            print(f"Final Portfolio Value: ${cash:.2f}")
-            print(f"Total Trades: {len(trades)}\n")
-            for trade in trades:
-                buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
-                      f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
-                      f"Return: {trade['return_pct']:.2f}%")
-
-            # plot_trades(prices, trades, TICKER)
-
-        except Exception as e:
-            print(f"Error while processing {TICKER}: {e}")
+        if error is not None:
+            print(f"Error while processing {TICKER}: {error}")
+            continue
+        if result is None:
+            print(f"No data for {TICKER}, skipping.")
+            continue
+
+        cash, trades = result
+        combined_final_value += cash
+        all_trades.extend(trades)
+
+        print(f"\n--- Backtest Result for {TICKER} ---")
+        print(f"Final Portfolio Value: ${cash:.2f}")
+        print(f"Total Trades: {len(trades)}\n")
+        for trade in trades:
+            buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
+                  f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
+                  f"Return: {trade['return_pct']:.2f}%")
 
     print("\n=== TOTAL STRATEGY SUMMARY ===")
     total_trades = len(all_trades)
@@ -1,14 +1,19 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.indicators import RollingMax
+from common.parallelrunner import run_tickers
+
 # Initialize timezone
 eastern = pytz.timezone('US/Eastern')
 
@@ -19,6 +24,7 @@ SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
 TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
 
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
 
 # Parameters
 STARTING_CASH = 1000
@@ -33,15 +39,7 @@ START_DATE = datetime(2024, 7, 20, tzinfo=pytz.UTC)
 END_DATE = datetime(2025, 7, 20, tzinfo=pytz.UTC)
 
 def fetch_minute_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="sip"
-    )
-    bars = data_client.get_stock_bars(request).df
-    return bars.xs(symbol, level=0)
+    return bar_cache.get_bars(symbol, start, end, TimeFrame.Minute, feed="sip")
 
 def run_backtest(prices):
     prices["sma10"] = prices["close"].rolling(10).mean()
@@ -52,7 +50,16 @@ def run_backtest(prices):
     position = None
     trades = []
 
+    # Max close over bars [i - DROP_LOOKBACK_BARS - 1, i - 2], fed one bar per step
+    closes = prices["close"].to_numpy()
+    max_close_window = RollingMax(DROP_LOOKBACK_BARS)
+    for close in closes[:DROP_LOOKBACK_BARS]:
+        max_close_window.update(close)
+
     for i in range(DROP_LOOKBACK_BARS + 1, len(prices)):
+        if i - 2 >= DROP_LOOKBACK_BARS:
+            max_close_window.update(closes[i - 2])
+
         signal_candle = prices.iloc[i]
         now = prices.iloc[i]
         now_time = now.name
@@ -91,8 +98,7 @@ def run_backtest(prices):
                 position = None
 
         else:
-            window = prices.iloc[i - DROP_LOOKBACK_BARS - 1:i - 1]
-            max_close = window["close"].max()
+            max_close = max_close_window.value
             drop_pct = (signal_candle["close"] - max_close) / max_close * 100
             sma10 = prices["sma10"].iloc[i - 1]
             trend_ok = signal_candle["close"] > sma10
@@ -153,37 +159,40 @@ def plot_trades(prices, trades, ticker):
     plt.show()
 
 
+def backtest_ticker(ticker):
+    prices = fetch_minute_data(ticker, START_DATE, END_DATE)
+    if prices.empty:
+        return None
+    return run_backtest(prices)
+
+
 def main():
     all_trades = []
     combined_final_value = 0
 
-    for TICKER in TICKERS:
+    for TICKER, result, error in run_tickers(backtest_ticker, TICKERS):
         print(f"\n=== Running Backtest for {TICKER} ===")
-        try:
-            prices = fetch_minute_data(TICKER, START_DATE, END_DATE)
-            if prices.empty:
-                print(f"No data for {TICKER}, skipping.")
-                continue
-
-            cash, trades = run_backtest(prices)
-            combined_final_value += cash
-            all_trades.extend(trades)
-
-            print(f"\n--- Backtest Result for {TICKER} ---")
-            print(f"Final Portfolio Value: ${cash:.2f}")
-            print(f"Total Trades: {len(trades)}\n")
-            for trade in trades:
-                buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
-                print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
-                      f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
-                      f"Return: {trade['return_pct']:.2f}% "
-                      f"{'| ' + trade['note'] if 'note' in trade and trade['note'] else ''}")
-
-            # plot_trades(prices, trades, TICKER)
-
-        except Exception as e:
-            print(f"Error while processing {TICKER}: {e}")
+        if error is not None:
+            print(f"Error while processing {TICKER}: {error}")
+            continue
+        if result is None:
+            print(f"No data for {TICKER}, skipping.")
+            continue
+
+        cash, trades = result
+        combined_final_value += cash
+        all_trades.extend(trades)
+
+        print(f"\n--- Backtest Result for {TICKER} ---")
+        print(f"Final Portfolio Value: ${cash:.2f}")
+        print(f"Total Trades: {len(trades)}\n")
+        for trade in trades:
+            buy_time_est = trade["buy_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            sell_time_est = trade["sell_time"].astimezone(eastern).strftime("%Y-%m-%d %I:%M %p")
+            print(f"{buy_time_est} BUY @ ${trade['buy_price']:.2f} → "
+                  f"{sell_time_est} SELL @ ${trade['sell_price']:.2f} | "
+                  f"Return: {trade['return_pct']:.2f}% "
+                  f"{'| ' + trade['note'] if 'note' in trade and trade['note'] else ''}")
 
     print("\n=== TOTAL STRATEGY SUMMARY ===")
     total_trades = len(all_trades)
@@ -1,14 +1,18 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.parallelrunner import run_tickers
+
 # Timezone setup
 est = pytz.timezone("US/Eastern")
 
@@ -20,6 +24,7 @@ TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if t
 
 # Alpaca client
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
 
 # Strategy parameters
 STARTING_CASH = 1000
@@ -37,85 +42,90 @@ END_DATE = datetime(2025, 7, 1, tzinfo=pytz.UTC)
 
 
 def fetch_hourly_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Hour,
-        start=start,
-        end=end,
-        feed="sip"
-    )
-    bars = data_client.get_stock_bars(request).df
-    return bars.xs(symbol, level=0)
-
-
-def fetch_5min_exit_data(ticker, start_time, hold_hours):
-    end_time = start_time + timedelta(hours=hold_hours)
-    request = StockBarsRequest(
-        symbol_or_symbols=ticker,
-        timeframe=TimeFrame.Minute,
-        start=start_time,
-        end=end_time,
-        feed="sip"
+    return bar_cache.get_bars(symbol, start, end, TimeFrame.Hour, feed="sip")
+
+
+def fetch_minute_exit_data(symbol, start, end):
+    # Exits can run up to HOLD_HOURS_MAX past the last hourly bar
+    return bar_cache.get_bars(symbol, start, end + timedelta(hours=HOLD_HOURS_MAX), TimeFrame.Minute, feed="sip")
+
+
+def find_exit(minute_ns, minute_close, entry_ns, entry_price, max_price):
+    """
+    First minute bar in [entry, entry + HOLD_HOURS_MAX] that trips an exit.
+    The running peak includes the current bar. Returns (index or None, peak
+    over the scanned bars).
+    """
+    lo = np.searchsorted(minute_ns, entry_ns, side="left")
+    hi = np.searchsorted(minute_ns, entry_ns + HOLD_HOURS_MAX * 3600 * 10**9, side="right")
+    prices = minute_close[lo:hi]
+    if not len(prices):
+        return None, max_price
+
+    peaks = np.maximum.accumulate(np.maximum(prices, max_price))
+    return_pct = (prices - entry_price) / entry_price * 100
+    trailing_drop_pct = (prices - peaks) / peaks * 100
+    time_held = (minute_ns[lo:hi] - entry_ns) / 1e9 / 3600
+    hits = np.flatnonzero(
+        (return_pct >= TAKE_PROFIT_PCT) |
+        (return_pct <= STOP_LOSS_PCT) |
+        (trailing_drop_pct <= TRAILING_STOP_LOSS_PCT) |
+        (time_held >= HOLD_HOURS_MAX)
     )
-    bars = data_client.get_stock_bars(request).df
-    return bars.xs(ticker, level=0) if not bars.empty else pd.DataFrame()
+    if hits.size:
+        return lo + hits[0], peaks[hits[0]]
+    return None, peaks[-1]
 
 
-def run_backtest(ticker, prices):
+def run_backtest(prices, minute_prices):
     cash = STARTING_CASH
     position = None
     trades = []
     cooldown_end_time = None
 
+    hourly_close = prices["close"].to_numpy(dtype=float)
+    max_high = prices["high"].rolling(DROP_LOOKBACK_BARS).max().shift(2).to_numpy(dtype=float)
+    sma20 = prices["close"].rolling(20).mean().shift(1).to_numpy(dtype=float)
+    sma50 = prices["close"].rolling(50).mean().shift(1).to_numpy(dtype=float)
+    minute_ns = minute_prices.index.asi8
+    minute_close = minute_prices["close"].to_numpy(dtype=float)
+
     for i in range(DROP_LOOKBACK_BARS + 1, len(prices)):
-        now = prices.iloc[i]
-        now_time = now.name
-        current_price = now["close"]
+        now_time = prices.index[i]
+        current_price = hourly_close[i]
 
         if position:
-            exit_data = fetch_5min_exit_data(ticker, position["entry_time"], HOLD_HOURS_MAX)
-
-            for _, row in exit_data.iterrows():
-                exit_time = row.name
-                exit_price = row["close"]
-                time_held = (exit_time - position["entry_time"]).total_seconds() / 3600
-                max_price = max(position["max_price_since_entry"], exit_price)
-                position["max_price_since_entry"] = max_price
-
+            # Exits resolve on the next hourly bar from the preloaded minute bars
+            exit_idx, position["max_price_since_entry"] = find_exit(
+                minute_ns, minute_close, position["entry_time"].value,
+                position["entry_price"], position["max_price_since_entry"]
+            )
+            if exit_idx is not None:
+                exit_time = minute_prices.index[exit_idx]
+                exit_price = minute_close[exit_idx]
                 return_pct = (exit_price - position["entry_price"]) / position["entry_price"] * 100
-                trailing_drop_pct = (exit_price - max_price) / max_price * 100
-
-                if (return_pct >= TAKE_PROFIT_PCT or
-                    return_pct <= STOP_LOSS_PCT or
-                    trailing_drop_pct <= TRAILING_STOP_LOSS_PCT or
-                    time_held >= HOLD_HOURS_MAX):
-
-                    shares = position["shares"]
-                    cash += shares * exit_price
-                    trades.append({
-                        "buy_time": position["entry_time"],
-                        "buy_price": position["entry_price"],
-                        "sell_time": exit_time,
-                        "sell_price": exit_price,
-                        "return_pct": return_pct
-                    })
-                    position = None
-
-                    if return_pct <= STOP_LOSS_PCT:
-                        cooldown_end_time = exit_time + timedelta(hours=COOLDOWN_HOURS)
-                    break
+
+                shares = position["shares"]
+                cash += shares * exit_price
+                trades.append({
+                    "buy_time": position["entry_time"],
+                    "buy_price": position["entry_price"],
+                    "sell_time": exit_time,
+                    "sell_price": exit_price,
+                    "return_pct": return_pct
+                })
+                position = None
+
+                if return_pct <= STOP_LOSS_PCT:
+                    cooldown_end_time = exit_time + timedelta(hours=COOLDOWN_HOURS)
             continue
 
         if cooldown_end_time and now_time < cooldown_end_time:
             continue
 
-        window = prices.iloc[i - DROP_LOOKBACK_BARS - 1:i - 1]
-        max_high = window["high"].max()
-        drop_pct = (now["close"] - max_high) / max_high * 100
-        sma20 = prices["close"].rolling(20).mean().iloc[i - 1]
-        sma50 = prices["close"].rolling(50).mean().iloc[i - 1]
-        trend_ok = now["close"] > sma20 and sma20 > sma50
-        bounce_ok = now["close"] > prices.iloc[i - 1]["close"]
+        drop_pct = (current_price - max_high[i]) / max_high[i] * 100
+        trend_ok = current_price > sma20[i] and sma20[i] > sma50[i]
+        bounce_ok = current_price > hourly_close[i - 1]
 
         if drop_pct <= -DROP_PCT and trend_ok and bounce_ok:
             shares_to_buy = POSITION_SIZE / current_price
@@ -131,28 +141,33 @@ def run_backtest(ticker, prices):
     return cash, trades
 
 
+def backtest_ticker(ticker):
+    prices = fetch_hourly_data(ticker, START_DATE, END_DATE)
+    if prices.empty:
+        return None
+    return run_backtest(prices, fetch_minute_exit_data(ticker, START_DATE, END_DATE))
+
+
 def main():
     all_trades = []
     combined_final_value = 0
 
-    for TICKER in TICKERS:
+    for TICKER, result, error in run_tickers(backtest_ticker, TICKERS):
         print(f"\n=== Running Backtest for {TICKER} ===")
-        try:
-            prices = fetch_hourly_data(TICKER, START_DATE, END_DATE)
-            if prices.empty:
-                print(f"No data for {TICKER}, skipping.")
-                continue
-
-            cash, trades = run_backtest(TICKER, prices)
-            combined_final_value += cash
-            all_trades.extend(trades)
-
-            print(f"Final Portfolio Value: ${cash:.2f} | Trades: {len(trades)}")
-            for trade in trades:
-                print(f"BUY: {trade['buy_time']} @ {trade['buy_price']:.2f} → SELL: {trade['sell_time']} @ {trade['sell_price']:.2f} | Return: {trade['return_pct']:.2f}%")
-
-        except Exception as e:
-            print(f"Error while processing {TICKER}: {e}")
+        if error is not None:
+            print(f"Error while processing {TICKER}: {error}")
+            continue
+        if result is None:
+            print(f"No data for {TICKER}, skipping.")
+            continue
+
+        cash, trades = result
+        combined_final_value += cash
+        all_trades.extend(trades)
+
+        print(f"Final Portfolio Value: ${cash:.2f} | Trades: {len(trades)}")
+        for trade in trades:
+            print(f"BUY: {trade['buy_time']} @ {trade['buy_price']:.2f} → SELL: {trade['sell_time']} @ {trade['sell_price']:.2f} | Return: {trade['return_pct']:.2f}%")
 
     print("\n=== STRATEGY SUMMARY ===")
     total_trades = len(all_trades)
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from datetime import datetime, timedelta
 import pytz
@@ -8,11 +9,18 @@ from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batchfetch import fetch_bars_batch
+from common.positionstore import POSITION_STORE, FirestorePositionStore, SqlitePositionStore
+from common.previousclose import PreviousCloseService
+from common.tradingcalendar import session_bounds
+from common.windowstore import MemoryWindowStore, refresh_windows
+from common.minutescheduler import run_every_minute
+
 # === STRATEGY PARAMETERS ===
 POSITION_SIZE = 20000
 DROP_PCT = 3.0
@@ -20,17 +28,26 @@ TAKE_PROFIT_PCT = 2.0
 STOP_LOSS_PCT = -0.35
 HOLD_HOURS_MAX = 72
 DROP_LOOKBACK_BARS = 60
+BACKFILL_MINUTES = 60  # short windows are padded with the previous close until this far into the session
+
+# === DAEMON MODE ===
+# DAEMON_MODE=1 keeps one process running every minute instead of a cron job per minute
+DAEMON_MODE = os.getenv("DAEMON_MODE", "").lower() in ("1", "true", "yes")
+DAEMON_MAX_MINUTES = int(os.getenv("DAEMON_MAX_MINUTES", "350"))  # GitHub Actions jobs are cut off at 6h
 
 
-# Firebase setup
+# Position log storage: Firebase, or a local SQLite file with POSITION_STORE=sqlite
 load_dotenv()
-key_str = os.getenv("FIREBASE_KEY")
-key_dict = json.loads(key_str)
-cred = credentials.Certificate(key_dict)
+if POSITION_STORE == "sqlite":
+    position_store = SqlitePositionStore()
+else:
+    key_str = os.getenv("FIREBASE_KEY")
+    key_dict = json.loads(key_str)
+    cred = credentials.Certificate(key_dict)
 
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-positions_ref = db.collection("positions")
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+    position_store = FirestorePositionStore(db)
 
 
 # === SETUP ===
@@ -40,55 +57,25 @@ TICKERS = [t.strip() for t in os.getenv("TICKERS", "").split(",") if t.strip()]
 
 trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+window_store = MemoryWindowStore()  # lookback windows stay in memory between daemon runs
 
 eastern = pytz.timezone("US/Eastern")
 
 def load_position_log():
-    docs = positions_ref.stream()
-    return {doc.id: doc.to_dict() for doc in docs}
+    return position_store.load()
 
 
 def save_position_log(log):
-    for ticker, data in log.items():
-        positions_ref.document(ticker).set(data)
-
-
-def fetch_recent_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="sip",
-    )
-    bars = data_client.get_stock_bars(request).df
-    if bars.empty or symbol not in bars.index.get_level_values(0):
-        return None
-    return bars.xs(symbol, level=0)
+    # Only added, changed and removed tickers are written, in one batch
+    position_store.save(log)
 
 
-def fetch_previous_day_close_data(symbol):
-    utc_now = datetime.now(pytz.UTC)
-    days_back = 1
+def fetch_recent_data_batch(symbols, start, end):
+    return fetch_bars_batch(data_client, symbols, start, end, TimeFrame.Minute, feed="sip")
 
-    while True:
-        prev_day = (utc_now - timedelta(days=days_back)).date()
-        start = datetime.combine(prev_day, datetime.min.time(), tzinfo=pytz.UTC) + timedelta(hours=19)  # 3:00 PM ET
-        end = datetime.combine(prev_day, datetime.min.time(), tzinfo=pytz.UTC) + timedelta(hours=20)   # 4:00 PM ET
 
-        print(f"[INFO] Attempting previous close data for {symbol} from {start.strftime('%A %Y-%m-%d')}")
-
-        bars = fetch_recent_data(symbol, start, end)
-        if bars is not None and not bars.empty:
-            return bars
-
-        # Go back one more day (weekend/holiday)
-        days_back += 1
-
-        # Safety limit: don't go back more than 5 days
-        if days_back > 5:
-            print(f"[WARN] Could not find valid previous close data for {symbol} in last 5 days.")
-            return None
+# Last hour of the previous session, fetched once per trading day for every ticker that needs it
+previous_close = PreviousCloseService(fetch_recent_data_batch)
 
 
 def evaluate_sell_condition(current_price, now_time, entry_time, entry_price):
@@ -172,7 +159,7 @@ def process_ticker(ticker, prices, current_position, position_log):
                 )
             )
             print(f"[SELL] {ticker} at ${current_price:.2f} | Return: {return_pct:.2f}%")
-            positions_ref.document(ticker).delete()
+            del position_log[ticker]
 
 
     else:
@@ -202,15 +189,42 @@ def process_ticker(ticker, prices, current_position, position_log):
                 }
                 print(f"[BUY] {ticker} at ${current_price:.2f} | Drop: {drop_pct:.2f}%")
 
-def main():
+def run_once():
     utc_now = datetime.now(pytz.UTC)
     start_time = utc_now - timedelta(minutes=DROP_LOOKBACK_BARS + 2)
 
     position_log = load_position_log()
     open_positions = {p.symbol: p for p in trading_client.get_all_positions()}
 
-   
-
+    # One batched request for every ticker; in daemon mode only the bars since the last run
+    try:
+        recent_prices = refresh_windows(window_store, fetch_recent_data_batch, TICKERS, start_time, utc_now)
+    except Exception as e:
+        # Keep going: cleanup still runs and the tickers are retried or skipped one by one below
+        print(f"[ERROR] Batched fetch failed: {e}")
+        recent_prices = {}
+
+    # The first BACKFILL_MINUTES of the session (10:30 AM ET on a regular day) can't fill a full window yet
+    session = session_bounds(datetime.now(eastern).date())
+    before_1030 = session is None or utc_now <= session[0] + timedelta(minutes=BACKFILL_MINUTES)
+    incomplete = [t for t in TICKERS if t not in recent_prices or len(recent_prices[t]) < DROP_LOOKBACK_BARS]
+    if incomplete and not before_1030:
+        print(f"[WARN] Missing/incomplete data for {', '.join(incomplete)} after 10:30 AM. Retrying fetch...")
+        try:
+            retried = fetch_recent_data_batch(incomplete, start_time, utc_now)  # one retry
+        except Exception as e:
+            print(f"[ERROR] Retry fetch failed: {e}")
+            retried = {}
+        for ticker, bars in retried.items():
+            window_store.save(ticker, bars, utc_now)
+        recent_prices.update(retried)
+
+    prev_closes = {}
+    if incomplete and before_1030:
+        try:
+            prev_closes = previous_close.get(incomplete, utc_now)
+        except Exception as e:
+            print(f"[WARN] Could not fetch previous close data: {e}")
 
     for ticker in TICKERS:
         try:
@@ -218,15 +232,12 @@ def main():
                 print(f"\n========== {ticker} ==========")
                 print(f"[CLEANUP] {ticker} found in log but not in Alpaca — removing stale log entry.")
                 del position_log[ticker]
-                positions_ref.document(ticker).delete()
                 continue  # Skip the rest for this ticker
 
-            prices = fetch_recent_data(ticker, start_time, utc_now)
+            prices = recent_prices.get(ticker)
             if prices is None or len(prices) < DROP_LOOKBACK_BARS:
-                now_et = datetime.now(eastern)
-
-                if now_et.hour < 10 or (now_et.hour == 10 and now_et.minute <= 30):
-                    prev_close = fetch_previous_day_close_data(ticker)
+                if before_1030:
+                    prev_close = prev_closes.get(ticker)
                     if prev_close is not None and not prev_close.empty:
                         prices = pd.concat([prev_close, prices]) if prices is not None else prev_close
                         print(f"[INFO] Augmented {ticker} with previous close data (pre-10:30 AM)")
@@ -234,12 +245,8 @@ def main():
                         print(f"[SKIP] {ticker} has insufficient data and no previous close to backfill")
                         continue
                 else:
-                    print(f"[WARN] Missing/incomplete data for {ticker} after 10:30 AM. Retrying fetch...")
-                    prices = fetch_recent_data(ticker, start_time, utc_now)  # one retry
-
-                    if prices is None or len(prices) < DROP_LOOKBACK_BARS:
-                        print(f"[SKIP] {ticker} still missing data after retry. Skipping.")
-                        continue
+                    print(f"[SKIP] {ticker} still missing data after retry. Skipping.")
+                    continue
 
 
             active_position = open_positions.get(ticker)
@@ -251,6 +258,21 @@ def main():
     save_position_log(position_log)
 
 
+def main():
+    if not DAEMON_MODE:
+        run_once()
+        return
+
+    now = datetime.now(pytz.UTC)
+    session = session_bounds(datetime.now(eastern).date())
+    if session is None:
+        print("[DAEMON] Market closed today (weekend or holiday)")
+        return
+    # Run through the close, which is 1:00 PM ET on half-days
+    until = min(now + timedelta(minutes=DAEMON_MAX_MINUTES), session[1] + timedelta(minutes=1))
+    print(f"[DAEMON] Running every minute until {until:%H:%M} UTC")
+    run_every_minute(run_once, until)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
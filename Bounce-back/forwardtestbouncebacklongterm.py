@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from datetime import datetime, timedelta
 import pytz
@@ -8,11 +9,16 @@ from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batchfetch import fetch_bars_batch
+from common.positionstore import POSITION_STORE, FirestorePositionStore, SqlitePositionStore
+from common.previousclose import PreviousCloseService
+from common.windowstore import WindowStore, refresh_windows
+
 # === STRATEGY PARAMETERS ===
 POSITION_SIZE = 20000
 DROP_PCT = 3.0
@@ -22,15 +28,18 @@ HOLD_HOURS_MAX = 72
 DROP_LOOKBACK_BARS = 1200
 
 
-# Firebase setup
+# Position log storage: Firebase, or a local SQLite file with POSITION_STORE=sqlite
 load_dotenv()
-key_str = os.getenv("FIREBASE_KEY")
-key_dict = json.loads(key_str)
-cred = credentials.Certificate(key_dict)
+if POSITION_STORE == "sqlite":
+    position_store = SqlitePositionStore()
+else:
+    key_str = os.getenv("FIREBASE_KEY")
+    key_dict = json.loads(key_str)
+    cred = credentials.Certificate(key_dict)
 
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-positions_ref = db.collection("positions")
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+    position_store = FirestorePositionStore(db)
 
 
 # === SETUP ===
@@ -40,55 +49,25 @@ TICKERS = [t.strip() for t in os.getenv("TICKERS", "").split(",") if t.strip()]
 
 trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+window_store = WindowStore()
 
 eastern = pytz.timezone("US/Eastern")
 
 def load_position_log():
-    docs = positions_ref.stream()
-    return {doc.id: doc.to_dict() for doc in docs}
+    return position_store.load()
 
 
 def save_position_log(log):
-    for ticker, data in log.items():
-        positions_ref.document(ticker).set(data)
-
-
-def fetch_recent_data(symbol, start, end):
-    request = StockBarsRequest(
-        symbol_or_symbols=symbol,
-        timeframe=TimeFrame.Minute,
-        start=start,
-        end=end,
-        feed="sip",
-    )
-    bars = data_client.get_stock_bars(request).df
-    if bars.empty or symbol not in bars.index.get_level_values(0):
-        return None
-    return bars.xs(symbol, level=0)
-
-
-def fetch_previous_day_close_data(symbol):
-    utc_now = datetime.now(pytz.UTC)
-    days_back = 1
-
-    while True:
-        prev_day = (utc_now - timedelta(days=days_back)).date()
-        start = datetime.combine(prev_day, datetime.min.time(), tzinfo=pytz.UTC) + timedelta(hours=19)  # 3:00 PM ET
-        end = datetime.combine(prev_day, datetime.min.time(), tzinfo=pytz.UTC) + timedelta(hours=20)   # 4:00 PM ET
+    # Only added, changed and removed tickers are written, in one batch
+    position_store.save(log)
 
-        print(f"[INFO] Attempting previous close data for {symbol} from {start.strftime('%A %Y-%m-%d')}")
 
-        bars = fetch_recent_data(symbol, start, end)
-        if bars is not None and not bars.empty:
-            return bars
+def fetch_recent_data_batch(symbols, start, end):
+    return fetch_bars_batch(data_client, symbols, start, end, TimeFrame.Minute, feed="sip")
 
-        # Go back one more day (weekend/holiday)
-        days_back += 1
 
-        # Safety limit: don't go back more than 5 days
-        if days_back > 5:
-            print(f"[WARN] Could not find valid previous close data for {symbol} in last 5 days.")
-            return None
+# Last hour of the previous session, fetched once per trading day for every ticker that needs it
+previous_close = PreviousCloseService(fetch_recent_data_batch)
 
 
 def evaluate_sell_condition(current_price, now_time, entry_time, entry_price):
@@ -172,7 +151,7 @@ def process_ticker(ticker, prices, current_position, position_log):
                 )
             )
             print(f"[SELL] {ticker} at ${current_price:.2f} | Return: {return_pct:.2f}%")
-            positions_ref.document(ticker).delete()
+            del position_log[ticker]
 
 
     else:
@@ -209,8 +188,22 @@ def main():
     position_log = load_position_log()
     open_positions = {p.symbol: p for p in trading_client.get_all_positions()}
 
-   
-
+    # Only the bars since the last stored window are fetched; gaps fall back to a full batched fetch
+    try:
+        recent_prices = refresh_windows(window_store, fetch_recent_data_batch, TICKERS, start_time, utc_now)
+    except Exception as e:
+        # Keep going: cleanup still runs and each ticker without data fails on its own below
+        print(f"[ERROR] Batched fetch failed: {e}")
+        recent_prices = {}
+
+    # Short or missing windows are padded with the previous session's close, in one batched request
+    incomplete = [t for t in TICKERS if t not in recent_prices or len(recent_prices[t]) < DROP_LOOKBACK_BARS]
+    prev_closes = {}
+    if incomplete:
+        try:
+            prev_closes = previous_close.get(incomplete, utc_now)
+        except Exception as e:
+            print(f"[WARN] Could not fetch previous close data: {e}")
 
     for ticker in TICKERS:
         try:
@@ -218,14 +211,20 @@ def main():
                 print(f"\n========== {ticker} ==========")
                 print(f"[CLEANUP] {ticker} found in log but not in Alpaca — removing stale log entry.")
                 del position_log[ticker]
-                positions_ref.document(ticker).delete()
                 continue  # Skip the rest for this ticker
 
-            prices = fetch_recent_data(ticker, start_time, utc_now)
-            if prices is None or len(prices) < DROP_LOOKBACK_BARS:
-                prices = fetch_recent_data(ticker, start_time, utc_now)  # one retry
-
-                
+            prices = recent_prices.get(ticker)
+            prev_close = prev_closes.get(ticker)
+            if prev_close is not None and not prev_close.empty:
+                if prices is not None and not prices.empty:
+                    prev_close = prev_close[prev_close.index < prices.index[0]]
+                    prices = pd.concat([prev_close, prices])
+                else:
+                    prices = prev_close
+                print(f"[INFO] Augmented {ticker} with previous close data")
+            if prices is None or prices.empty:
+                print(f"[SKIP] {ticker} has no data. Skipping.")
+                continue
 
             active_position = open_positions.get(ticker)
             process_ticker(ticker, prices, active_position, position_log)
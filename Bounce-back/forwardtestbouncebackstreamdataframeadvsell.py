@@ -1,4 +1,5 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import pytz
@@ -10,8 +11,19 @@ from alpaca.data.live import StockDataStream
 from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 from alpaca.trading.client import TradingClient
+from alpaca.trading.stream import TradingStream
 from alpaca.trading.requests import MarketOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
+from alpaca.trading.enums import OrderSide, TimeInForce, TradeEvent
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bouncebackengine import BouncebackParams
+from common.bouncebackstrategy import BouncebackStrategy
+from common.orderexecutor import AsyncOrderExecutor, order_failed
+from common.asynclog import AsyncLogWriter
+from common.barcache import BarCache
+from common.replaystream import REPLAY_START, REPLAY_END, ReplayDataStream, FakeTradingClient
+from common.latency import LatencyRecorder
+from common.fillledger import FILL_LEDGER_FILE, FillLedger
 
 # === CONFIGURATION ===
 load_dotenv()
@@ -27,45 +39,73 @@ DROP_LOOKBACK_BARS = 60
 ROLLING_WINDOW_SIZE = DROP_LOOKBACK_BARS + 10
 POSITION_SIZE = 20000
 
+PARAMS = BouncebackParams(
+    starting_cash=0,  # cash is tracked by the broker when live
+    position_size=POSITION_SIZE,
+    drop_pct=DROP_PCT,
+    take_profit_pct=TAKE_PROFIT_PCT,
+    stop_loss_pct=STOP_LOSS_PCT,
+    hold_hours_max=HOLD_HOURS_MAX,
+    drop_lookback_bars=DROP_LOOKBACK_BARS,
+    trailing_stop_loss_pct=TRAILING_STOP_LOSS_PCT,
+    market_hours_only=False,
+)
+
 # === GLOBAL STATE ===
-position = {}
-prices_df = {}
+strategy = BouncebackStrategy(PARAMS, whole_shares=True, buffer_size=ROLLING_WINDOW_SIZE)
+position = strategy.positions
 eastern = pytz.timezone('US/Eastern')
 
 # === Alpaca Clients ===
-trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
-stream = StockDataStream(API_KEY, SECRET_KEY)
+if REPLAY_START:
+    # Offline replay of stored bars against a fake broker; no orders reach Alpaca
+    stream = ReplayDataStream(BarCache(data_client), REPLAY_START, REPLAY_END)
+    trading_client = FakeTradingClient(stream)
+    trading_stream = trading_client  # the fake broker reports its own fills
+else:
+    trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
+    stream = StockDataStream(API_KEY, SECRET_KEY)
+    trading_stream = TradingStream(API_KEY, SECRET_KEY, paper=True)
+latency = LatencyRecorder(track_bar_delay=not REPLAY_START)
+# Fills arrive on the trade-updates stream, so orders are not polled until filled
+order_executor = AsyncOrderExecutor(trading_client, latency=latency, poll_fills=False)
+if REPLAY_START:
+    stream.settle = order_executor.drain
+fill_ledger = FillLedger(None if REPLAY_START else FILL_LEDGER_FILE)
 
 # === LOGGING SETUP ===
 LOG_FILE = "output.log"
+logger = AsyncLogWriter(LOG_FILE)
 
 def log_message(msg):
-    with open(LOG_FILE, "a") as f:
-        f.write(msg + "\n")
+    logger.write(msg)
 
 # === LOAD OPEN POSITIONS ===
 def load_open_positions():
-    global position
     try:
         live_positions = trading_client.get_all_positions()
+        fill_ledger.reconcile({pos.symbol.upper() for pos in live_positions})
         for pos in live_positions:
             symbol = pos.symbol.upper()
-            entry_price = float(pos.avg_entry_price)
-            position[symbol] = {
-                "entry_time": datetime.now(pytz.UTC),  # Approximate since API doesn't return this
-                "entry_price": entry_price,
-                "shares": int(pos.qty),
-                "max_price_since_entry": entry_price
-            }
-            print(f"[INIT] Loaded open position: {symbol} | Entry: {entry_price} | Shares: {pos.qty}")
-            log_message(f"[INIT] Loaded open position: {symbol} | Entry: {entry_price} | Shares: {pos.qty}")
+            filled = fill_ledger.get(symbol)
+            strategy.open_position(
+                symbol,
+                filled["entry_time"] if filled else datetime.now(pytz.UTC),  # API doesn't return entry times
+                float(pos.avg_entry_price),
+                int(pos.qty)
+            )
+            print(f"[INIT] Loaded open position: {symbol} | Entry: {pos.avg_entry_price} | Shares: {pos.qty}")
+            log_message(f"[INIT] Loaded open position: {symbol} | Entry: {pos.avg_entry_price} | Shares: {pos.qty}")
     except Exception as e:
         print(f"[ERROR] Failed to load positions: {e}")
         log_message(f"[ERROR] Failed to load positions: {e}")
 
 # === Initialize DF with Historical Bars ===
 def init_prices_df(ticker) -> pd.DataFrame:
+    if REPLAY_START:
+        return stream.history(ticker, ROLLING_WINDOW_SIZE)
+
     end = datetime.now(pytz.UTC)
     start = end - timedelta(minutes=ROLLING_WINDOW_SIZE + 5)
     request = StockBarsRequest(
@@ -77,80 +117,76 @@ def init_prices_df(ticker) -> pd.DataFrame:
     bars = data_client.get_stock_bars(request).df
     return bars.xs(ticker, level=0).tail(ROLLING_WINDOW_SIZE)
 
-# === Strategy Logic on New Bar ===
-def process_new_bar(new_bar):
-    global prices_df, position
-    symbol = new_bar.symbol
+# === Order Callbacks ===
+def on_buy_done(symbol, order, error):
+    if order_failed(order, error):
+        reason = error if error is not None else order.status
+        print(f"[ORDER ERROR] BUY {symbol} failed: {reason} — dropping position")
+        log_message(f"[ORDER ERROR] BUY {symbol} failed: {reason} — dropping position")
+        position.pop(symbol, None)
+    elif order.filled_avg_price is not None and symbol in position:
+        position[symbol]["entry_price"] = float(order.filled_avg_price)
 
-    if symbol not in prices_df:
-        prices_df[symbol] = pd.DataFrame()
+def on_sell_done(symbol, held, order, error):
+    if order_failed(order, error):
+        reason = error if error is not None else order.status
+        print(f"[ORDER ERROR] SELL {symbol} failed: {reason} — keeping position")
+        log_message(f"[ORDER ERROR] SELL {symbol} failed: {reason} — keeping position")
+        position.setdefault(symbol, held)
 
-    new_row = pd.DataFrame([{
-        "timestamp": new_bar.timestamp,
-        "open": new_bar.open,
-        "high": new_bar.high,
-        "low": new_bar.low,
-        "close": new_bar.close,
-        "volume": new_bar.volume
-    }]).set_index("timestamp")
+# === Trade Updates ===
+async def handle_trade_update(update):
+    if update.event == TradeEvent.FILL:
+        latency.order_filled(update.order.id)
+    filled = fill_ledger.apply(update)
+    symbol = update.order.symbol
+    # Exits are measured from the actual fill, not the bar close the signal fired on
+    if filled is not None and update.order.side == OrderSide.BUY and symbol in position:
+        position[symbol]["entry_price"] = filled["avg_price"]
+        position[symbol]["entry_time"] = filled["entry_time"]
+        position[symbol]["shares"] = filled["qty"]
 
-    prices_df[symbol] = pd.concat([prices_df[symbol], new_row])
-    prices_df[symbol] = prices_df[symbol].tail(ROLLING_WINDOW_SIZE)
-
-    if len(prices_df[symbol]) < DROP_LOOKBACK_BARS + 1:
+# === Strategy Logic on New Bar ===
+def process_new_bar(new_bar):
+    signal = strategy.on_bar(
+        new_bar.symbol, new_bar.timestamp, new_bar.open, new_bar.high, new_bar.low, new_bar.close, new_bar.volume
+    )
+    decided_at = latency.decided(new_bar.symbol)
+    if signal is None:
         return
 
-    current_time = new_bar.timestamp
-    current_price = new_bar.close
-    signal_candle = prices_df[symbol].iloc[-1]
-    prev_window = prices_df[symbol].iloc[-(DROP_LOOKBACK_BARS + 1):-1]
-
-    if symbol in position:
-        entry_price = position[symbol]["entry_price"]
-        time_held = (current_time - position[symbol]["entry_time"]).total_seconds() / 3600
-        return_pct = (current_price - entry_price) / entry_price * 100
-
-        if return_pct >= TAKE_PROFIT_PCT or return_pct <= STOP_LOSS_PCT or time_held >= HOLD_HOURS_MAX:
-            print(f"[SELL] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Return: {return_pct:.2f}%")
-            log_message(
-                f"[SELL] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Return: {return_pct:.2f}%"
-            )
-            trading_client.submit_order(
-                MarketOrderRequest(
-                    symbol=symbol,
-                    qty=int(position[symbol]["shares"]),
-                    side=OrderSide.SELL,
-                    time_in_force=TimeInForce.DAY
-                )
-            )
-            del position[symbol]
+    symbol = signal.symbol
+    if signal.side == "sell":
+        peak_note = f" | From Peak: {signal.trailing_drop_pct:.2f}%" if signal.trailing_drop_pct is not None else ""
+        message = f"[SELL] [{symbol}] {change_timezone(signal.timestamp)} | Price: {signal.price:.2f} | Return: {signal.return_pct:.2f}%{peak_note}"
+        print(message)
+        log_message(message)
+        held = strategy.apply(signal)
+        order_executor.submit(
+            MarketOrderRequest(
+                symbol=symbol,
+                qty=int(held["shares"]),
+                side=OrderSide.SELL,
+                time_in_force=TimeInForce.DAY
+            ),
+            lambda order, error: on_sell_done(symbol, held, order, error),
+            decided_at
+        )
     else:
-        max_high = prev_window["high"].max()
-        drop_pct = (signal_candle["close"] - max_high) / max_high * 100
-        sma10 = prices_df[symbol]["close"].rolling(10).mean().iloc[-1]
-        trend_ok = signal_candle["close"] > sma10
-
-        if drop_pct <= -DROP_PCT and trend_ok:
-            shares_to_buy = int(POSITION_SIZE / current_price)
-            if shares_to_buy > 0:
-                print(f"[BUY] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Drop: {drop_pct:.2f}% ")
-                log_message(
-                    f"[BUY] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Drop: {drop_pct:.2f}% "
-                )
-                trading_client.submit_order(
-                    MarketOrderRequest(
-                        symbol=symbol,
-                        qty=shares_to_buy,
-                        side=OrderSide.BUY,
-                        time_in_force=TimeInForce.DAY
-                    )
-                )
-                position[symbol] = {
-                    "entry_time": current_time,
-                    "entry_price": current_price,
-                    "shares": shares_to_buy,
-                    "max_price_since_entry": current_price
-                }
+        message = f"[BUY] [{symbol}] {change_timezone(signal.timestamp)} | Price: {signal.price:.2f} | Drop: {signal.drop_pct:.2f}% "
+        print(message)
+        log_message(message)
+        strategy.apply(signal)
+        order_executor.submit(
+            MarketOrderRequest(
+                symbol=symbol,
+                qty=signal.shares,
+                side=OrderSide.BUY,
+                time_in_force=TimeInForce.DAY
+            ),
+            lambda order, error: on_buy_done(symbol, order, error),
+            decided_at
+        )
 
 # === Time Formatting ===
 def change_timezone(timestamp):
@@ -160,46 +196,26 @@ def change_timezone(timestamp):
 # === Websocket Handler ===
 async def handle_bar(bar):
     symbol = bar.symbol
+    latency.bar_received(symbol, bar.timestamp)
     process_new_bar(bar)
 
     if symbol in position:
         entry_price = position[symbol]["entry_price"]
-        max_price = position[symbol]["max_price_since_entry"]
-
-        if bar.close > max_price:
-            position[symbol]["max_price_since_entry"] = bar.close
-            max_price = bar.close
-
         time_held = (bar.timestamp - position[symbol]["entry_time"]).total_seconds() / 3600
         return_pct = (bar.close - entry_price) / entry_price * 100
-        trailing_drop_pct = (bar.close - max_price) / max_price * 100
 
         # === LIVE RETURN LOG ===
         print(f"[LIVE RETURN] [{symbol}] {change_timezone(bar.timestamp)} | Price: {bar.close:.2f} | Return: {return_pct:.2f}% | Held: {time_held:.2f}h")
         log_message(f"[LIVE RETURN] [{symbol}] {change_timezone(bar.timestamp)} | Price: {bar.close:.2f} | Return: {return_pct:.2f}% | Held: {time_held:.2f}h")
 
-        if trailing_drop_pct <= TRAILING_STOP_LOSS_PCT or return_pct <= STOP_LOSS_PCT or time_held >= HOLD_HOURS_MAX:
-            print(f"[SELL] [{symbol}] {change_timezone(bar.timestamp)} | Price: {bar.close:.2f} | Return: {return_pct:.2f}% | From Peak: {trailing_drop_pct:.2f}%")
-            log_message(f"[SELL] [{symbol}] {change_timezone(bar.timestamp)} | Price: {bar.close:.2f} | Return: {return_pct:.2f}% | From Peak: {trailing_drop_pct:.2f}%")
-
-            trading_client.submit_order(
-                MarketOrderRequest(
-                    symbol=symbol,
-                    qty=int(position[symbol]["shares"]),
-                    side=OrderSide.SELL,
-                    time_in_force=TimeInForce.DAY
-                )
-            )
-            del position[symbol]
-
-    if symbol not in prices_df or len(prices_df[symbol]) < DROP_LOOKBACK_BARS + 1:
+    state = strategy.states.get(symbol)
+    if state is None or state.last_max_high is None:
         return
 
-    prev_window = prices_df[symbol].iloc[-(DROP_LOOKBACK_BARS + 1):-1]
-    max_high = prev_window["high"].max()
+    max_high = state.last_max_high
     drop_pct = (bar.close - max_high) / max_high * 100
 
-    sma10 = prices_df[symbol]["close"].rolling(10).mean().iloc[-1]
+    sma10 = state.last_sma10
     above_sma = "yes" if bar.close > sma10 else "no"
 
     formatted_time = change_timezone(bar.timestamp)
@@ -215,15 +231,36 @@ async def handle_bar(bar):
     )
 
 # === Run ===
+async def stop_background_tasks(tasks):
+    """Cancels the tasks and collects their results, so a crash in one is logged, not lost."""
+    for task in tasks:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Background task failed: {result}")
+            log_message(f"[ERROR] Background task failed: {result}")
+
 async def main():
     print("Starting Bounce-back Forward Test with Advanced sell logic...")
-    global prices_df
     load_open_positions()
+    order_executor.start()
+    trading_stream.subscribe_trade_updates(handle_trade_update)
+    background_tasks = [asyncio.create_task(trading_stream._run_forever())]
     for ticker in TICKERS:
-        prices_df[ticker] = init_prices_df(ticker)
+        history = init_prices_df(ticker)
+        strategy.warm_up(ticker, history)
         stream.subscribe_bars(handle_bar, ticker)
 
-    await stream._run_forever()
+    background_tasks.append(asyncio.create_task(latency.dump_loop(log_message)))
+    try:
+        await stream._run_forever()
+        if REPLAY_START:
+            await order_executor.close()
+    finally:
+        await stop_background_tasks(background_tasks)
+        report = latency.report()
+        print(report)
+        log_message(report)
 
 if __name__ == "__main__":
     asyncio.run(main())
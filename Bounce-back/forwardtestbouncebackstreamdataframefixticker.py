@@ -1,4 +1,5 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import pytz
@@ -7,11 +8,24 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.live import StockDataStream
-from alpaca.data.requests import StockBarsRequest
+from alpaca.data.requests import StockBarsRequest, StockLatestBarRequest
 from alpaca.data.timeframe import TimeFrame
 from alpaca.trading.client import TradingClient
+from alpaca.trading.stream import TradingStream
 from alpaca.trading.requests import MarketOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
+from alpaca.trading.enums import OrderSide, TimeInForce, TradeEvent
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.ringbuffer import to_epoch_ns
+from common.bouncebackengine import BouncebackParams
+from common.bouncebackstrategy import BouncebackStrategy
+from common.orderexecutor import AsyncOrderExecutor, order_failed
+from common.asynclog import AsyncLogWriter
+from common.barcache import BarCache
+from common.replaystream import REPLAY_START, REPLAY_END, ReplayDataStream, FakeTradingClient
+from common.latency import LatencyRecorder
+from common.fillledger import FILL_LEDGER_FILE, FillLedger
+from common.tradingcalendar import session_bounds
 
 # === CONFIGURATION ===
 load_dotenv()
@@ -25,38 +39,63 @@ HOLD_HOURS_MAX = 72
 DROP_LOOKBACK_BARS = 60
 ROLLING_WINDOW_SIZE = DROP_LOOKBACK_BARS + 10
 POSITION_SIZE = 20000
+BACKFILL_DELAY_SECONDS = 5  # stream bars for a minute arrive just after it closes
+
+PARAMS = BouncebackParams(
+    starting_cash=0,  # cash is tracked by the broker when live
+    position_size=POSITION_SIZE,
+    drop_pct=DROP_PCT,
+    take_profit_pct=TAKE_PROFIT_PCT,
+    stop_loss_pct=STOP_LOSS_PCT,
+    hold_hours_max=HOLD_HOURS_MAX,
+    drop_lookback_bars=DROP_LOOKBACK_BARS,
+    market_hours_only=False,
+)
 
 # === GLOBAL STATE ===
-position = {}
-prices_df = {}
+strategy = BouncebackStrategy(PARAMS, whole_shares=True, buffer_size=ROLLING_WINDOW_SIZE)
+position = strategy.positions
 eastern = pytz.timezone('US/Eastern')
-received_tickers = set()
-current_minute = None
 
 # === Alpaca Clients ===
-trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
 data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
-stream = StockDataStream(API_KEY, SECRET_KEY)
+if REPLAY_START:
+    # Offline replay of stored bars against a fake broker; no orders reach Alpaca
+    stream = ReplayDataStream(BarCache(data_client), REPLAY_START, REPLAY_END)
+    trading_client = FakeTradingClient(stream)
+    trading_stream = trading_client  # the fake broker reports its own fills
+else:
+    trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
+    stream = StockDataStream(API_KEY, SECRET_KEY)
+    trading_stream = TradingStream(API_KEY, SECRET_KEY, paper=True)
+latency = LatencyRecorder(track_bar_delay=not REPLAY_START)
+# Fills arrive on the trade-updates stream, so orders are not polled until filled
+order_executor = AsyncOrderExecutor(trading_client, latency=latency, poll_fills=False)
+if REPLAY_START:
+    stream.settle = order_executor.drain
+fill_ledger = FillLedger(None if REPLAY_START else FILL_LEDGER_FILE)
 
 # === LOGGING SETUP ===
 LOG_FILE = "output.log"
+logger = AsyncLogWriter(LOG_FILE)
 
 def log_message(msg):
-    with open(LOG_FILE, "a") as f:
-        f.write(msg + "\n")
+    logger.write(msg)
 
 # === LOAD OPEN POSITIONS ===
 def load_open_positions():
-    global position
     try:
         live_positions = trading_client.get_all_positions()
+        fill_ledger.reconcile({pos.symbol.upper() for pos in live_positions})
         for pos in live_positions:
             symbol = pos.symbol.upper()
-            position[symbol] = {
-                "entry_price": float(pos.avg_entry_price),
-                "entry_time": datetime.now(pytz.UTC),  # Approximate since API doesn't return this
-                "shares": int(pos.qty)
-            }
+            filled = fill_ledger.get(symbol)
+            strategy.open_position(
+                symbol,
+                filled["entry_time"] if filled else datetime.now(pytz.UTC),  # API doesn't return entry times
+                float(pos.avg_entry_price),
+                int(pos.qty)
+            )
             print(f"[INIT] Loaded open position: {symbol} | Entry: {pos.avg_entry_price} | Shares: {pos.qty}")
             log_message(f"[INIT] Loaded open position: {symbol} | Entry: {pos.avg_entry_price} | Shares: {pos.qty}")
     except Exception as e:
@@ -66,6 +105,9 @@ def load_open_positions():
 
 # === Initialize DF with Historical Bars ===
 def init_prices_df(ticker) -> pd.DataFrame:
+    if REPLAY_START:
+        return stream.history(ticker, ROLLING_WINDOW_SIZE)
+
     end = datetime.now(pytz.UTC)
     start = end - timedelta(minutes=ROLLING_WINDOW_SIZE + 5)
     request = StockBarsRequest(
@@ -81,124 +123,119 @@ def init_prices_df(ticker) -> pd.DataFrame:
     else:
         return pd.DataFrame()  # If no data is returned, fallback to empty
 
-# === Trigger Backfill for Missing Tickers ===
-async def trigger_backfill():
-    await asyncio.sleep(5)  # Wait until about the 5th second of the new minute
+# === Minute-Aligned Backfill for Missing Tickers ===
+def last_bar_ns(ticker):
+    state = strategy.states.get(ticker)
+    return int(state.bars.timestamps(1)[-1]) if state is not None and len(state.bars) else 0
 
-    missing_tickers = [ticker for ticker in TICKERS if ticker not in received_tickers]
+async def backfill_missing(minute_start):
+    """Fills in the bar for minute_start for every ticker the stream skipped, with one batched request."""
+    # Outside the regular session there is no bar to miss (sessions never cross midnight UTC)
+    session = session_bounds(minute_start.date())
+    if session is None or not session[0] <= minute_start < session[1]:
+        return
 
+    expected_ns = to_epoch_ns(minute_start)
+    missing_tickers = [ticker for ticker in TICKERS if last_bar_ns(ticker) < expected_ns]
     if not missing_tickers:
         return
 
+    latest_bars = await asyncio.to_thread(
+        data_client.get_stock_latest_bar,
+        StockLatestBarRequest(symbol_or_symbols=missing_tickers)
+    )
+
     for ticker in missing_tickers:
+        bar = latest_bars.get(ticker)
+        # The stream may have delivered the bar while the request was in flight
+        if bar is None or to_epoch_ns(bar.timestamp) <= last_bar_ns(ticker):
+            continue
+        latency.bar_received(ticker, bar.timestamp)
+        process_new_bar(bar)
+        print(f"[BACKFILL] {ticker} backfilled successfully")
+        log_message(f"[BACKFILL] {ticker} backfilled successfully")
+
+async def backfill_loop():
+    while True:
+        now = datetime.now(pytz.UTC)
+        next_run = now.replace(second=0, microsecond=0) + timedelta(minutes=1, seconds=BACKFILL_DELAY_SECONDS)
+        await asyncio.sleep((next_run - now).total_seconds())
         try:
-            request = StockBarsRequest(
-                symbol_or_symbols=ticker,
-                timeframe=TimeFrame.Minute,
-                limit=1
-            )
-            bars = data_client.get_stock_bars(request).df
-
-            if isinstance(bars.index, pd.MultiIndex):
-                latest_bar = bars.xs(ticker, level=0).iloc[-1]
-            else:
-                latest_bar = bars.iloc[-1]
-
-            class Bar:
-                def __init__(self, symbol, row):
-                    self.symbol = symbol
-                    self.timestamp = row.name
-                    self.open = row['open']
-                    self.high = row['high']
-                    self.low = row['low']
-                    self.close = row['close']
-                    self.volume = row['volume']
-
-            backfill_bar = Bar(ticker, latest_bar)
-            process_new_bar(backfill_bar)
-
-            print(f"[BACKFILL] {ticker} backfilled successfully")
-            log_message(f"[BACKFILL] {ticker} backfilled successfully")
-
+            await backfill_missing(next_run.replace(second=0) - timedelta(minutes=1))
         except Exception as e:
-            print(f"[BACKFILL ERROR] {ticker}: {e}")
-            log_message(f"[BACKFILL ERROR] {ticker}: {e}")
-
-
+            print(f"[BACKFILL ERROR] {e}")
+            log_message(f"[BACKFILL ERROR] {e}")
+
+
+# === Order Callbacks ===
+def on_buy_done(symbol, order, error):
+    if order_failed(order, error):
+        reason = error if error is not None else order.status
+        print(f"[ORDER ERROR] BUY {symbol} failed: {reason} — dropping position")
+        log_message(f"[ORDER ERROR] BUY {symbol} failed: {reason} — dropping position")
+        position.pop(symbol, None)
+    elif order.filled_avg_price is not None and symbol in position:
+        position[symbol]["entry_price"] = float(order.filled_avg_price)
+
+def on_sell_done(symbol, held, order, error):
+    if order_failed(order, error):
+        reason = error if error is not None else order.status
+        print(f"[ORDER ERROR] SELL {symbol} failed: {reason} — keeping position")
+        log_message(f"[ORDER ERROR] SELL {symbol} failed: {reason} — keeping position")
+        position.setdefault(symbol, held)
+
+# === Trade Updates ===
+async def handle_trade_update(update):
+    if update.event == TradeEvent.FILL:
+        latency.order_filled(update.order.id)
+    filled = fill_ledger.apply(update)
+    symbol = update.order.symbol
+    # Exits are measured from the actual fill, not the bar close the signal fired on
+    if filled is not None and update.order.side == OrderSide.BUY and symbol in position:
+        position[symbol]["entry_price"] = filled["avg_price"]
+        position[symbol]["entry_time"] = filled["entry_time"]
+        position[symbol]["shares"] = filled["qty"]
 
 # === Strategy Logic on New Bar ===
 def process_new_bar(new_bar):
-    global prices_df, position
-    symbol = new_bar.symbol
-
-    if symbol not in prices_df:
-        prices_df[symbol] = pd.DataFrame()
-
-    new_row = pd.DataFrame([{
-        "timestamp": new_bar.timestamp,
-        "open": new_bar.open,
-        "high": new_bar.high,
-        "low": new_bar.low,
-        "close": new_bar.close,
-        "volume": new_bar.volume
-    }]).set_index("timestamp")
-
-    prices_df[symbol] = pd.concat([prices_df[symbol], new_row])
-    prices_df[symbol] = prices_df[symbol].tail(ROLLING_WINDOW_SIZE)
-
-    if len(prices_df[symbol]) < DROP_LOOKBACK_BARS + 1:
+    signal = strategy.on_bar(
+        new_bar.symbol, new_bar.timestamp, new_bar.open, new_bar.high, new_bar.low, new_bar.close, new_bar.volume
+    )
+    decided_at = latency.decided(new_bar.symbol)
+    if signal is None:
         return
 
-    current_time = new_bar.timestamp
-    current_price = new_bar.close
-    signal_candle = prices_df[symbol].iloc[-1]
-    prev_window = prices_df[symbol].iloc[-(DROP_LOOKBACK_BARS + 1):-1]
-
-    if symbol in position:
-        entry_price = position[symbol]["entry_price"]
-        time_held = (current_time - position[symbol]["entry_time"]).total_seconds() / 3600
-        return_pct = (current_price - entry_price) / entry_price * 100
-
-        if return_pct >= TAKE_PROFIT_PCT or return_pct <= STOP_LOSS_PCT or time_held >= HOLD_HOURS_MAX:
-            print(f"[SELL] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Return: {return_pct:.2f}%")
-            log_message(
-                f"[SELL] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Return: {return_pct:.2f}%"
-            )
-            trading_client.submit_order(
-                MarketOrderRequest(
-                    symbol=symbol,
-                    qty=int(position[symbol]["shares"]),
-                    side=OrderSide.SELL,
-                    time_in_force=TimeInForce.DAY
-                )
-            )
-            del position[symbol]
+    symbol = signal.symbol
+    if signal.side == "sell":
+        message = f"[SELL] [{symbol}] {change_timezone(signal.timestamp)} | Price: {signal.price:.2f} | Return: {signal.return_pct:.2f}%"
+        print(message)
+        log_message(message)
+        held = strategy.apply(signal)
+        order_executor.submit(
+            MarketOrderRequest(
+                symbol=symbol,
+                qty=int(held["shares"]),
+                side=OrderSide.SELL,
+                time_in_force=TimeInForce.DAY
+            ),
+            lambda order, error: on_sell_done(symbol, held, order, error),
+            decided_at
+        )
     else:
-        max_high = prev_window["high"].max()
-        drop_pct = (signal_candle["close"] - max_high) / max_high * 100
-        sma10 = prices_df[symbol]["close"].rolling(10).mean().iloc[-1]
-        trend_ok = signal_candle["close"] > sma10
-
-        if drop_pct <= -DROP_PCT and trend_ok:
-            shares_to_buy = int(POSITION_SIZE / current_price)
-            if shares_to_buy > 0:
-                print(f"[BUY] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Drop: {drop_pct:.2f}% ")
-                log_message(
-                    f"[BUY] [{symbol}] {change_timezone(current_time)} | Price: {current_price:.2f} | Drop: {drop_pct:.2f}% "
-                )
-                trading_client.submit_order(
-                    MarketOrderRequest(
-                        symbol=symbol,
-                        qty=shares_to_buy,
-                        side=OrderSide.BUY,
-                        time_in_force=TimeInForce.DAY
-                    )
-                )
-                position[symbol] = {
-                    "entry_time": current_time,
-                    "entry_price": current_price,
-                    "shares": shares_to_buy
-                }
+        message = f"[BUY] [{symbol}] {change_timezone(signal.timestamp)} | Price: {signal.price:.2f} | Drop: {signal.drop_pct:.2f}% "
+        print(message)
+        log_message(message)
+        strategy.apply(signal)
+        order_executor.submit(
+            MarketOrderRequest(
+                symbol=symbol,
+                qty=signal.shares,
+                side=OrderSide.BUY,
+                time_in_force=TimeInForce.DAY
+            ),
+            lambda order, error: on_buy_done(symbol, order, error),
+            decided_at
+        )
 
 # === Time Formatting ===
 def change_timezone(timestamp):
@@ -211,22 +248,13 @@ def change_timezone(timestamp):
 
 
 async def handle_bar(bar):
-    global current_minute
     symbol = bar.symbol
-    received_tickers.add(symbol)
-
-    # Detect new minute
-    bar_minute = bar.timestamp.replace(second=0, microsecond=0)
-
-    if current_minute is None:
-        current_minute = bar_minute
 
-    if bar_minute != current_minute:
-        # Minute has changed, trigger backfill for the previous minute
-        await trigger_backfill()
-        received_tickers.clear()
-        current_minute = bar_minute
+    # Already merged by the backfill task
+    if to_epoch_ns(bar.timestamp) <= last_bar_ns(symbol):
+        return
 
+    latency.bar_received(symbol, bar.timestamp)
     process_new_bar(bar)
 
 
@@ -242,16 +270,16 @@ async def handle_bar(bar):
 
 
     # Ensure data is long enough
-    if symbol not in prices_df or len(prices_df[symbol]) < DROP_LOOKBACK_BARS + 1:
+    state = strategy.states.get(symbol)
+    if state is None or state.last_max_high is None:
         return
 
     # Calculate % drop from peak
-    prev_window = prices_df[symbol].iloc[-(DROP_LOOKBACK_BARS + 1):-1]
-    max_high = prev_window["high"].max()
+    max_high = state.last_max_high
     drop_pct = (bar.close - max_high) / max_high * 100
 
     # Compare to SMA10
-    sma10 = prices_df[symbol]["close"].rolling(10).mean().iloc[-1]
+    sma10 = state.last_sma10
     above_sma = "yes" if bar.close > sma10 else "no"
 
     # Format and print
@@ -268,14 +296,37 @@ async def handle_bar(bar):
     )
 
 # === Run ===
+async def stop_background_tasks(tasks):
+    """Cancels the tasks and collects their results, so a crash in one is logged, not lost."""
+    for task in tasks:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Background task failed: {result}")
+            log_message(f"[ERROR] Background task failed: {result}")
+
 async def main():
-    global prices_df
     load_open_positions()
+    order_executor.start()
+    trading_stream.subscribe_trade_updates(handle_trade_update)
+    trade_updates_task = asyncio.create_task(trading_stream._run_forever())
     for ticker in TICKERS:
-        prices_df[ticker] = init_prices_df(ticker)
+        history = init_prices_df(ticker)
+        strategy.warm_up(ticker, history)
         stream.subscribe_bars(handle_bar, ticker)
 
-    await stream._run_forever()
+    background_tasks = [trade_updates_task, asyncio.create_task(latency.dump_loop(log_message))]
+    if not REPLAY_START:
+        background_tasks.append(asyncio.create_task(backfill_loop()))
+    try:
+        await stream._run_forever()
+        if REPLAY_START:
+            await order_executor.close()
+    finally:
+        await stop_background_tasks(background_tasks)
+        report = latency.report()
+        print(report)
+        log_message(report)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+import sys
+import pandas as pd
+from datetime import datetime
+import pytz
+from dotenv import load_dotenv
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrame
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.bouncebackengine import BouncebackParams
+from common.bouncebacksweep import param_grid, build_features, run_sweep
+
+# Load credentials
+load_dotenv()
+API_KEY = os.getenv("APCA_API_KEY_ID")
+SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
+TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
+
+data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
+
+START_DATE = datetime(2025, 5, 1, tzinfo=pytz.UTC)
+END_DATE = datetime(2025, 7, 1, tzinfo=pytz.UTC)
+TOP_N = 25
+
+# Fixed settings, same as backtestbouncebackadvsell.py
+BASE_PARAMS = BouncebackParams(
+    starting_cash=1100,
+    position_size=800,
+    drop_pct=1.7,
+    take_profit_pct=6,
+    stop_loss_pct=-1.5,
+    hold_hours_max=48,
+    drop_lookback_bars=200,
+    trailing_stop_loss_pct=-1.8,
+    cooldown_minutes=60,
+    require_sma20=True,
+    require_bounce=True,
+)
+
+# Values to sweep; every combination is evaluated
+GRID = {
+    "drop_pct": [1.0, 1.5, 1.7, 2.0, 2.5, 3.0],
+    "take_profit_pct": [2, 4, 6, 8],
+    "stop_loss_pct": [-0.5, -1.0, -1.5, -2.0],
+    "trailing_stop_loss_pct": [None, -1.0, -1.8, -2.5],
+    "drop_lookback_bars": [60, 200, 600],
+    "cooldown_minutes": [0, 60],
+}
+
+
+def main():
+    prices_by_ticker = {}
+    for ticker in TICKERS:
+        prices = bar_cache.get_bars(ticker, START_DATE, END_DATE, TimeFrame.Minute, feed="sip")
+        if prices.empty:
+            print(f"No data for {ticker}, skipping.")
+            continue
+        prices_by_ticker[ticker] = prices
+
+    if not prices_by_ticker:
+        print("No data to sweep.")
+        return
+
+    grid = param_grid(BASE_PARAMS, GRID)
+    print(f"Sweeping {len(grid)} combinations over {', '.join(prices_by_ticker)}...")
+    features = build_features(prices_by_ticker, GRID["drop_lookback_bars"])
+    ranked = run_sweep(features, grid)
+
+    rows = []
+    for params, summary in ranked[:TOP_N]:
+        swept = {key: getattr(params, key) for key in GRID}
+        swept = {key: "off" if value is None else value for key, value in swept.items()}
+        rows.append({**swept, **summary})
+    print(f"\n=== TOP {TOP_N} PARAMETER SETS BY FINAL VALUE ===")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
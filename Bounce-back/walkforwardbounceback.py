@@ -0,0 +1,102 @@
+import os
+import sys
+import pandas as pd
+from datetime import datetime
+import pytz
+from dotenv import load_dotenv
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrame
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.barcache import BarCache
+from common.bouncebackengine import BouncebackParams
+from common.bouncebacksweep import param_grid, build_features
+from common.walkforward import walk_forward_windows, run_walk_forward
+
+# Load credentials
+load_dotenv()
+API_KEY = os.getenv("APCA_API_KEY_ID")
+SECRET_KEY = os.getenv("APCA_API_SECRET_KEY")
+TICKERS = [ticker.strip() for ticker in os.getenv("TICKERS", "").split(",") if ticker.strip()]
+
+data_client = StockHistoricalDataClient(API_KEY, SECRET_KEY)
+bar_cache = BarCache(data_client)
+
+START_DATE = datetime(2025, 1, 1, tzinfo=pytz.UTC)
+END_DATE = datetime(2025, 7, 1, tzinfo=pytz.UTC)
+TRAIN_DAYS = 60
+TEST_DAYS = 14
+
+# Fixed settings, same as backtestbouncebackadvsell.py
+BASE_PARAMS = BouncebackParams(
+    starting_cash=1100,
+    position_size=800,
+    drop_pct=1.7,
+    take_profit_pct=6,
+    stop_loss_pct=-1.5,
+    hold_hours_max=48,
+    drop_lookback_bars=200,
+    trailing_stop_loss_pct=-1.8,
+    cooldown_minutes=60,
+    require_sma20=True,
+    require_bounce=True,
+)
+
+# Values optimized on every train window
+GRID = {
+    "drop_pct": [1.0, 1.7, 2.5, 3.0],
+    "take_profit_pct": [2, 4, 6],
+    "stop_loss_pct": [-0.5, -1.0, -1.5],
+    "trailing_stop_loss_pct": [None, -1.0, -1.8],
+    "drop_lookback_bars": [60, 200, 600],
+}
+
+
+def main():
+    prices_by_ticker = {}
+    for ticker in TICKERS:
+        prices = bar_cache.get_bars(ticker, START_DATE, END_DATE, TimeFrame.Minute, feed="sip")
+        if prices.empty:
+            print(f"No data for {ticker}, skipping.")
+            continue
+        prices_by_ticker[ticker] = prices
+
+    windows = walk_forward_windows(START_DATE, END_DATE, TRAIN_DAYS, TEST_DAYS)
+    if not prices_by_ticker or not windows:
+        print("Not enough data for a walk-forward run.")
+        return
+
+    grid = param_grid(BASE_PARAMS, GRID)
+    print(f"Walk-forward: {len(windows)} windows x {len(grid)} combinations over {', '.join(prices_by_ticker)}...")
+    features = build_features(prices_by_ticker, GRID["drop_lookback_bars"])
+    results = run_walk_forward(features, grid, windows)
+
+    rows = []
+    for result in results:
+        params = result["params"]
+        rows.append({
+            "test_window": f"{result['test_start']:%Y-%m-%d} → {result['test_end']:%Y-%m-%d}",
+            **{key: "off" if getattr(params, key) is None else getattr(params, key) for key in GRID},
+            "train_return": result["train"]["total_return_pct"],
+            "test_return": result["test"]["total_return_pct"],
+            "test_trades": result["test"]["trades"],
+            "test_win_rate": result["test"]["win_rate"],
+            "test_sharpe": result["test"]["sharpe"],
+        })
+    table = pd.DataFrame(rows)
+
+    print("\n=== WALK-FORWARD RESULTS (best train params scored on the next test window) ===")
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    print("\n=== OUT-OF-SAMPLE SUMMARY ===")
+    total_trades = table["test_trades"].sum()
+    print(f"Avg Train Return: {table['train_return'].mean():.2f}% | Avg Test Return: {table['test_return'].mean():.2f}%")
+    if total_trades > 0:
+        win_rate = (table["test_win_rate"] * table["test_trades"]).sum() / total_trades
+        print(f"Test Trades: {total_trades} | Test Win Rate: {win_rate:.2f}%")
+    else:
+        print("No trades were executed out of sample.")
+
+
+if __name__ == "__main__":
+    main()
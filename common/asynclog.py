@@ -0,0 +1,101 @@
+import os
+import glob
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "jsonl"
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 10))
+MAX_BATCH = 1000
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """
+    write() only puts the message on a queue, so callers never touch the disk.
+    A daemon thread drains everything queued since its last pass and writes
+    it with a single write and flush. The file at path, including one left by
+    an earlier run, is rotated when it passes max_bytes or the UTC day of
+    this writer's first write to it ends. Rotation renames it to
+    <path>.<YYYYmmdd-HHMMSS-ffffff>, so no run's log is overwritten, and only
+    the newest backup_count are kept. Queued lines are flushed at exit.
+    """
+
+    def __init__(self, path, fmt=LOG_FORMAT, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        if fmt not in ("text", "jsonl"):
+            raise ValueError(f"Unknown log format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._opened_day = None   # UTC day of the first write to the current file
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, msg, **fields):
+        self._queue.put((datetime.now(timezone.utc), msg, fields))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _format(self, timestamp, msg, fields):
+        if self.fmt == "text":
+            return msg + "\n"
+        return json.dumps({"ts": timestamp.isoformat(), "msg": msg, **fields}, default=str) + "\n"
+
+    def _open(self):
+        self._opened_day = None
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        os.replace(self.path, f"{self.path}.{stamp}")
+        for old in sorted(glob.glob(glob.escape(self.path) + ".*"))[:-self.backup_count or None]:
+            os.remove(old)
+        self._file = None
+
+    def _write_batch(self, batch):
+        if self._file is None:
+            self._open()
+        if self._opened_day is None:
+            self._opened_day = batch[0][0].date()
+        if batch[-1][0].date() != self._opened_day or self._file.tell() >= self.max_bytes:
+            self._rotate()
+            self._open()
+            self._opened_day = batch[-1][0].date()
+        self._file.write("".join(self._format(*record) for record in batch))
+        self._file.flush()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            stopping = first is _STOP
+            batch = [] if stopping else [first]
+            while len(batch) < MAX_BATCH and not stopping:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                else:
+                    batch.append(record)
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"[LOG ERROR] Dropped {len(batch)} log lines: {e}")
+            if stopping:
+                if self._file is not None:
+                    self._file.close()
+                return
@@ -0,0 +1,157 @@
+import os
+import json
+from datetime import datetime, timedelta
+import pytz
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from alpaca.data.requests import StockBarsRequest
+from alpaca.data.timeframe import TimeFrame
+
+# === CONFIGURATION ===
+# Bars are stored as <BAR_CACHE_DIR>/<feed>/<timeframe>/<SYMBOL>.parquet with one
+# row group per UTC day, plus a <SYMBOL>.days.json listing every day already fetched
+# (weekends and holidays included, so empty days are not requested again).
+BAR_CACHE_DIR = os.getenv(
+    "BAR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".barcache"),
+)
+BAR_CACHE_OFFLINE = os.getenv("BAR_CACHE_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# A day is only marked complete once it is this far in the past, so late bars still land
+DAY_SETTLE_DELAY = timedelta(hours=1)
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume", "trade_count", "vwap"]
+
+
+def _utc_day(dt):
+    return pd.Timestamp(dt).tz_convert(pytz.UTC).normalize()
+
+
+def _day_range(start, end):
+    """All UTC days touched by [start, end]."""
+    return list(pd.date_range(_utc_day(start), _utc_day(end), freq="D"))
+
+
+def _contiguous_runs(days):
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+class BarCache:
+    def __init__(self, data_client, root=BAR_CACHE_DIR, offline=BAR_CACHE_OFFLINE):
+        self.data_client = data_client
+        self.root = root
+        self.offline = offline
+
+    # === File layout ===
+    def _paths(self, symbol, timeframe, feed):
+        folder = os.path.join(self.root, str(feed or "default"), timeframe.value)
+        return (
+            os.path.join(folder, f"{symbol.upper()}.parquet"),
+            os.path.join(folder, f"{symbol.upper()}.days.json"),
+        )
+
+    def _load_days(self, days_path):
+        if not os.path.exists(days_path):
+            return set()
+        with open(days_path) as f:
+            return set(json.load(f))
+
+    def _load_bars(self, bars_path, start=None, end=None):
+        if not os.path.exists(bars_path):
+            return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz=pytz.UTC, name="timestamp"))
+
+        filters = None
+        if start is not None and end is not None:
+            # Lets pyarrow skip whole day row groups outside the requested range
+            filters = [("timestamp", ">=", pd.Timestamp(start)), ("timestamp", "<=", pd.Timestamp(end))]
+        return pd.read_parquet(bars_path, filters=filters)
+
+    def _write_bars(self, bars_path, bars):
+        os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+        tmp_path = bars_path + ".tmp"
+        day_keys = bars.index.normalize()
+        writer = None
+        try:
+            for _, day_bars in bars.groupby(day_keys, sort=True):
+                table = pa.Table.from_pandas(day_bars, preserve_index=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is not None:
+            os.replace(tmp_path, bars_path)
+
+    def _write_days(self, days_path, days):
+        os.makedirs(os.path.dirname(days_path), exist_ok=True)
+        tmp_path = days_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sorted(days), f)
+        os.replace(tmp_path, days_path)
+
+    # === Network ===
+    def _download(self, symbol, start, end, timeframe, feed):
+        request = StockBarsRequest(
+            symbol_or_symbols=symbol,
+            timeframe=timeframe,
+            start=start,
+            end=end,
+            feed=feed,
+        )
+        bars = self.data_client.get_stock_bars(request).df
+        if bars.empty or symbol not in bars.index.get_level_values(0):
+            return None
+        return bars.xs(symbol, level=0)
+
+    # === Public API ===
+    def missing_days(self, symbol, start, end, timeframe=TimeFrame.Minute, feed="sip"):
+        _, days_path = self._paths(symbol, timeframe, feed)
+        have = self._load_days(days_path)
+        return [day for day in _day_range(start, end) if day.strftime("%Y-%m-%d") not in have]
+
+    def get_bars(self, symbol, start, end, timeframe=TimeFrame.Minute, feed="sip"):
+        """
+        Returns bars for symbol between start and end (inclusive) indexed by UTC
+        timestamp, the same shape as get_stock_bars(...).df.xs(symbol, level=0).
+        Only the days not already on disk are downloaded.
+        """
+        bars_path, days_path = self._paths(symbol, timeframe, feed)
+        missing = self.missing_days(symbol, start, end, timeframe, feed)
+
+        if missing and not self.offline:
+            have = self._load_days(days_path)
+            stored = self._load_bars(bars_path)
+            fetched = []
+            settled_before = datetime.now(pytz.UTC) - DAY_SETTLE_DELAY
+
+            for run in _contiguous_runs(missing):
+                run_start = run[0]
+                run_end = min(run[-1] + timedelta(days=1), pd.Timestamp(datetime.now(pytz.UTC)))
+                print(f"[CACHE] Downloading {symbol} {timeframe.value} bars "
+                      f"{run_start.strftime('%Y-%m-%d')} → {run[-1].strftime('%Y-%m-%d')}")
+                bars = self._download(symbol, run_start, run_end, timeframe, feed)
+                if bars is not None and not bars.empty:
+                    fetched.append(bars)
+                for day in run:
+                    if day + timedelta(days=1) <= settled_before:
+                        have.add(day.strftime("%Y-%m-%d"))
+
+            if fetched:
+                merged = pd.concat([stored] + fetched) if not stored.empty else pd.concat(fetched)
+                merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+                self._write_bars(bars_path, merged)
+            self._write_days(days_path, have)
+
+        elif missing:
+            print(f"[CACHE] Offline: {len(missing)} day(s) of {symbol} not in the store, serving what is cached")
+
+        bars = self._load_bars(bars_path, start, end)
+        return bars.sort_index()
@@ -0,0 +1,55 @@
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+# Raw bar keys of the market data API, in the column order of BarSet.df
+BAR_COLUMNS = {
+    "o": "open",
+    "h": "high",
+    "l": "low",
+    "c": "close",
+    "v": "volume",
+    "n": "trade_count",
+    "vw": "vwap",
+}
+
+
+def decode_bars(raw_bars, tz=None):
+    """
+    Decodes the raw get_stock_bars() result of a raw_data=True client,
+    {symbol: [{"t", "o", "h", "l", "c", "v", "n", "vw"}, ...]}, straight
+    into NumPy columns, without building a Bar model per bar. Values fill
+    preallocated float64 columns across all symbols. The RFC 3339
+    timestamps are parsed in one vectorized call, and tz is applied once
+    to the whole column. Returns {symbol: DataFrame indexed by timestamp},
+    the same frames as splitting BarSet.df; symbols without bars are absent.
+    """
+    raw_bars = {symbol: bars for symbol, bars in raw_bars.items() if bars}
+    lengths = [len(bars) for bars in raw_bars.values()]
+    total = sum(lengths)
+    if not total:
+        return {}
+
+    columns = {
+        name: np.fromiter(
+            (bar.get(key, np.nan) for bar in chain.from_iterable(raw_bars.values())),
+            dtype=np.float64,
+            count=total,
+        )
+        for key, name in BAR_COLUMNS.items()
+    }
+    timestamps = pd.to_datetime(
+        [bar["t"] for bar in chain.from_iterable(raw_bars.values())], utc=True, format="ISO8601"
+    )
+    if tz is not None:
+        timestamps = timestamps.tz_convert(tz)
+    timestamps = timestamps.rename("timestamp")
+
+    frames = {}
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    for symbol, start, end in zip(raw_bars, offsets[:-1], offsets[1:]):
+        frames[symbol] = pd.DataFrame(
+            {name: values[start:end] for name, values in columns.items()},
+            index=timestamps[start:end],
+        )
+    return frames
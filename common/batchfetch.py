@@ -0,0 +1,47 @@
+from alpaca.data.requests import StockBarsRequest
+from alpaca.data.timeframe import TimeFrame
+
+from common.baringest import decode_bars
+
+# Keeps the symbols query string well inside URL length limits
+MAX_SYMBOLS_PER_REQUEST = 200
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_bars_batch(data_client, symbols, start, end, timeframe=TimeFrame.Minute, feed=None, tz=None):
+    """
+    Fetches bars for many symbols with one paginated request per chunk of
+    MAX_SYMBOLS_PER_REQUEST symbols, and splits the result with a single groupby.
+    Returns {symbol: DataFrame indexed by timestamp}; symbols without bars are absent.
+    Pass tz to convert every timestamp once, before the split. With a
+    raw_data=True client the response is decoded by decode_bars() instead.
+    """
+    frames = {}
+    for chunk in chunked(list(dict.fromkeys(symbols)), MAX_SYMBOLS_PER_REQUEST):
+        request = StockBarsRequest(
+            symbol_or_symbols=chunk,
+            timeframe=timeframe,
+            start=start,
+            end=end,
+            feed=feed,
+        )
+        result = data_client.get_stock_bars(request)
+        if isinstance(result, dict):
+            # raw_data=True client: decode the JSON into columns, no Bar objects
+            frames.update(decode_bars(result, tz))
+            continue
+
+        bars = result.df
+        if bars.empty:
+            continue
+
+        if tz is not None:
+            bars.index = bars.index.set_levels(bars.index.levels[1].tz_convert(tz), level=1)
+
+        for symbol, symbol_bars in bars.groupby(level=0, sort=False):
+            frames[symbol] = symbol_bars.droplevel(0)
+    return frames
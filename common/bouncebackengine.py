@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from common.tradingcalendar import session_mask
+
+# Exit scans start small (most trades close within a few hours) and double from there
+EXIT_SCAN_CHUNK = 512
+
+
+@dataclass(frozen=True)
+class BouncebackParams:
+    starting_cash: float
+    position_size: float
+    drop_pct: float
+    take_profit_pct: float
+    stop_loss_pct: float
+    hold_hours_max: float
+    drop_lookback_bars: int
+    trailing_stop_loss_pct: Optional[float] = None
+    cooldown_minutes: float = 0        # entry blackout after a stop-loss exit
+    require_sma20: bool = False        # trend also needs SMA10 > SMA20
+    require_bounce: bool = False       # signal close must be above the previous close
+    market_hours_only: bool = True
+
+
+def market_hours_mask(index):
+    """Regular-session check for a UTC DatetimeIndex: NYSE hours, holidays and 1:00 PM early closes included."""
+    return session_mask(index)
+
+
+class BouncebackFeatures:
+    """
+    Per-ticker arrays shared by every simulation over the same bars. Lookback
+    dependent columns are computed once per lookback and cached, so parameter
+    sweeps only pay for them once.
+    """
+
+    def __init__(self, prices):
+        self.index = prices.index
+        self.ns = prices.index.asi8
+        self.close = prices["close"].to_numpy(dtype=float)
+        self.high = prices["high"].to_numpy(dtype=float)
+        self.session = market_hours_mask(prices.index)
+
+        close = prices["close"]
+        self.prev_close = close.shift(1).to_numpy(dtype=float)
+        self.prev_sma10 = close.rolling(10).mean().shift(1).to_numpy(dtype=float)
+        self.prev_sma20 = close.rolling(20).mean().shift(1).to_numpy(dtype=float)
+        self._max_high = {}
+
+    def __len__(self):
+        return len(self.close)
+
+    def max_high(self, lookback):
+        """Max high over the lookback bars ending two bars before each row."""
+        if lookback not in self._max_high:
+            rolled = pd.Series(self.high).rolling(lookback).max().shift(2)
+            self._max_high[lookback] = rolled.to_numpy(dtype=float)
+        return self._max_high[lookback]
+
+    def drop_pct(self, lookback, start=0, stop=None):
+        max_high = self.max_high(lookback)[start:stop]
+        return (self.close[start:stop] - max_high) / max_high * 100
+
+
+def entry_signals(features, params, start=0, stop=None):
+    """Entry mask for bars [start, stop). Only that slice is computed, so short windows stay cheap on long series."""
+    window = slice(start, stop)
+    close = features.close[window]
+    prev_sma10 = features.prev_sma10[window]
+    drop_pct = features.drop_pct(params.drop_lookback_bars, start, stop)
+    signals = (drop_pct <= -params.drop_pct) & (close > prev_sma10)
+    if params.require_sma20:
+        signals &= prev_sma10 > features.prev_sma20[window]
+    if params.require_bounce:
+        signals &= close > features.prev_close[window]
+    if params.market_hours_only:
+        signals &= features.session[window]
+    signals[:max(0, params.drop_lookback_bars + 1 - start)] = False
+    return signals
+
+
+def find_exit(features, params, entry_idx, stop):
+    """Index of the first bar after entry_idx that trips an exit, or None."""
+    close = features.close
+    ns = features.ns
+    entry_price = close[entry_idx]
+    entry_ns = ns[entry_idx]
+    max_price = entry_price
+
+    start = entry_idx + 1
+    chunk = EXIT_SCAN_CHUNK
+    while start < stop:
+        end = min(stop, start + chunk)
+        bars = np.arange(start, end)
+        if params.market_hours_only:
+            bars = bars[features.session[start:end]]
+
+        if len(bars):
+            prices = close[bars]
+            return_pct = (prices - entry_price) / entry_price * 100
+            time_held = (ns[bars] - entry_ns) / 1e9 / 3600
+            should_sell = (
+                (return_pct >= params.take_profit_pct) |
+                (return_pct <= params.stop_loss_pct) |
+                (time_held >= params.hold_hours_max)
+            )
+            if params.trailing_stop_loss_pct is not None:
+                # Peak is taken before the current bar updates it
+                peaks = np.maximum.accumulate(np.concatenate(([max_price], prices[:-1])))
+                trailing_drop_pct = (prices - peaks) / peaks * 100
+                should_sell |= trailing_drop_pct <= params.trailing_stop_loss_pct
+
+            hits = np.flatnonzero(should_sell)
+            if hits.size:
+                return bars[hits[0]]
+            max_price = max(max_price, prices.max())
+
+        start = end
+        chunk *= 2
+    return None
+
+
+def _make_trade(features, entry_idx, exit_idx, return_pct):
+    return {
+        "buy_time": features.index[entry_idx],
+        "buy_price": features.close[entry_idx],
+        "sell_time": features.index[exit_idx],
+        "sell_price": features.close[exit_idx],
+        "return_pct": return_pct
+    }
+
+
+def run_bounceback_backtest(features, params, start=0, stop=None):
+    """
+    Event-driven replay of the bounce-back rules: entries come from precomputed
+    signal arrays and each open position is resolved with a vectorized exit scan.
+    Returns (cash, trades) exactly like the per-bar loop it replaces.
+    """
+    stop = len(features) if stop is None else stop
+    close = features.close
+    ns = features.ns
+
+    cash = params.starting_cash
+    trades = []
+    first = max(start, params.drop_lookback_bars + 1)
+    if first >= stop:
+        return cash, trades
+
+    candidates = np.flatnonzero(entry_signals(features, params, first, stop)) + first
+    candidate_ns = ns[candidates]
+    candidate_cost = (params.position_size / close[candidates]) * close[candidates]
+    cooldown_ns = int(params.cooldown_minutes * 60 * 1e9)
+
+    i = first
+    cooldown_end_ns = None
+    while True:
+        k = np.searchsorted(candidates, i)
+        if cooldown_end_ns is not None:
+            k = max(k, np.searchsorted(candidate_ns, cooldown_end_ns))
+        affordable = np.flatnonzero(cash >= candidate_cost[k:])
+        if not affordable.size:
+            break
+
+        entry_idx = candidates[k + affordable[0]]
+        entry_price = close[entry_idx]
+        shares = params.position_size / entry_price
+        cash -= shares * entry_price
+
+        exit_idx = find_exit(features, params, entry_idx, stop)
+        if exit_idx is None:
+            # Close any open position at the final price
+            final_idx = stop - 1
+            cash += shares * close[final_idx]
+            trades.append(_make_trade(features, entry_idx, final_idx, (close[final_idx] - entry_price) / entry_price * 100))
+            break
+
+        exit_price = close[exit_idx]
+        return_pct = (exit_price - entry_price) / entry_price * 100
+        cash += shares * exit_price
+        trades.append(_make_trade(features, entry_idx, exit_idx, return_pct))
+
+        if return_pct <= params.stop_loss_pct and cooldown_ns:
+            cooldown_end_ns = ns[exit_idx] + cooldown_ns
+        i = exit_idx + 1
+
+    return cash, trades
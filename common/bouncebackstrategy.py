@@ -0,0 +1,240 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from common.indicators import RollingMax, RollingSMA
+from common.ringbuffer import BarRingBuffer
+from common.tradingcalendar import is_session_time
+
+
+@dataclass(frozen=True)
+class Signal:
+    side: str                # "buy" or "sell"
+    symbol: str
+    timestamp: datetime
+    price: float
+    shares: float
+    drop_pct: Optional[float] = None            # buys
+    return_pct: Optional[float] = None          # sells
+    trailing_drop_pct: Optional[float] = None   # sells, when a trailing stop is set
+
+
+class SymbolState:
+    """Incremental per-symbol state; every update is O(1)."""
+
+    def __init__(self, lookback, buffer_size=None):
+        self.max_high = RollingMax(lookback)
+        self.sma10 = RollingSMA(10)
+        self.sma20 = RollingSMA(20)
+        self.bars = BarRingBuffer(buffer_size) if buffer_size else None
+        self.prev_close = None
+        self.last_max_high = None   # max high of the lookback bars before the latest one
+        self.last_sma10 = None      # SMA10 including the latest bar
+        self.last_sma20 = None
+        # The same values one bar earlier, for the vectorized backtest's alignment
+        self.prev_max_high = None
+        self.prev_sma10 = None
+        self.prev_sma20 = None
+        self.last_timestamp = None
+
+    def update(self, timestamp, open, high, low, close, volume):
+        if self.bars is not None:
+            self.bars.append(timestamp, open, high, low, close, volume)
+        self.prev_max_high, self.prev_sma10, self.prev_sma20 = self.last_max_high, self.last_sma10, self.last_sma20
+        self.last_max_high = self.max_high.value if self.max_high.ready else None
+        self.max_high.update(high)
+        self.last_sma10 = self.sma10.update(close)
+        self.last_sma20 = self.sma20.update(close)
+        self.last_timestamp = timestamp
+
+
+def is_market_hours(timestamp):
+    # Session bounds are cached per date, so this is two comparisons per bar
+    return is_session_time(timestamp)
+
+
+class BouncebackStrategy:
+    """
+    Bar-at-a-time bounce-back rules shared by the live stream bots and the
+    replay backtest driver, so both trade the same logic.
+
+    on_bar() updates the symbol's indicators and returns a Signal, or None.
+    The caller decides whether to act on a signal and commits it with
+    apply(). Live bots apply every signal immediately. The replay driver
+    first checks it can afford the buy.
+
+    Entries: close at least drop_pct below the max high of the previous
+    drop_lookback_bars bars, and close above SMA10, with optional SMA10 >
+    SMA20, bounce and market-hours filters. Exits: take profit, stop loss,
+    max hold, or an optional trailing stop from a peak that includes the
+    current bar. Off-session bars only update the indicators when
+    market_hours_only is set.
+
+    lagged=True reads every indicator one bar earlier, as the vectorized
+    backtest engine does: the max high ends two bars back, the SMAs and the
+    trailing-stop peak exclude the current bar. run_replay() then produces
+    the same trades as run_bounceback_backtest().
+    """
+
+    def __init__(self, params, whole_shares=True, buffer_size=None, lagged=False):
+        self.params = params
+        self.whole_shares = whole_shares
+        self.lagged = lagged
+        self.buffer_size = buffer_size
+        self.states = {}
+        self.positions = {}
+        self.cooldown_until = {}
+
+    def state(self, symbol):
+        if symbol not in self.states:
+            self.states[symbol] = SymbolState(self.params.drop_lookback_bars, self.buffer_size)
+        return self.states[symbol]
+
+    def warm_up(self, symbol, df):
+        """Feeds historical bars into the indicators without trading."""
+        self.states[symbol] = SymbolState(self.params.drop_lookback_bars, self.buffer_size)
+        for row in df.itertuples():
+            self._update(symbol, row.Index, row.open, row.high, row.low, row.close, row.volume)
+
+    def _update(self, symbol, timestamp, open, high, low, close, volume):
+        state = self.state(symbol)
+        prev_close = state.prev_close
+        state.update(timestamp, open, high, low, close, volume)
+        state.prev_close = close
+        return state, prev_close
+
+    def open_position(self, symbol, entry_time, entry_price, shares):
+        self.positions[symbol] = {
+            "entry_time": entry_time,
+            "entry_price": entry_price,
+            "shares": shares,
+            "max_price_since_entry": entry_price,
+        }
+
+    def on_bar(self, symbol, timestamp, open, high, low, close, volume):
+        state, prev_close = self._update(symbol, timestamp, open, high, low, close, volume)
+        params = self.params
+        # Off-session bars only feed the indicators, as the vectorized engine masks them
+        if params.market_hours_only and not is_market_hours(timestamp):
+            return None
+
+        position = self.positions.get(symbol)
+        if position is not None:
+            peak = position["max_price_since_entry"]
+            position["max_price_since_entry"] = max(peak, close)
+            if not self.lagged:
+                peak = position["max_price_since_entry"]
+            entry_price = position["entry_price"]
+            return_pct = (close - entry_price) / entry_price * 100
+            time_held = (timestamp - position["entry_time"]).total_seconds() / 3600
+            should_sell = (
+                return_pct >= params.take_profit_pct or
+                return_pct <= params.stop_loss_pct or
+                time_held >= params.hold_hours_max
+            )
+            trailing_drop_pct = None
+            if params.trailing_stop_loss_pct is not None:
+                trailing_drop_pct = (close - peak) / peak * 100
+                should_sell = should_sell or trailing_drop_pct <= params.trailing_stop_loss_pct
+            if should_sell:
+                return Signal("sell", symbol, timestamp, close, position["shares"],
+                              return_pct=return_pct, trailing_drop_pct=trailing_drop_pct)
+            return None
+
+        if self.lagged:
+            max_high, sma10, sma20 = state.prev_max_high, state.prev_sma10, state.prev_sma20
+        else:
+            max_high, sma10, sma20 = state.last_max_high, state.last_sma10, state.last_sma20
+        if max_high is None:
+            return None
+        if symbol in self.cooldown_until and timestamp < self.cooldown_until[symbol]:
+            return None
+
+        drop_pct = (close - max_high) / max_high * 100
+        entry_ok = drop_pct <= -params.drop_pct and close > sma10
+        if params.require_sma20:
+            entry_ok = entry_ok and sma10 > sma20
+        if params.require_bounce:
+            entry_ok = entry_ok and prev_close is not None and close > prev_close
+        if not entry_ok:
+            return None
+
+        shares = params.position_size / close
+        if self.whole_shares:
+            shares = int(shares)
+        if shares <= 0:
+            return None
+        return Signal("buy", symbol, timestamp, close, shares, drop_pct=drop_pct)
+
+    def apply(self, signal):
+        """Commits a signal to position state. For sells, returns the closed position."""
+        if signal.side == "buy":
+            self.open_position(signal.symbol, signal.timestamp, signal.price, signal.shares)
+            return None
+        closed = self.positions.pop(signal.symbol)
+        if signal.return_pct <= self.params.stop_loss_pct and self.params.cooldown_minutes:
+            self.cooldown_until[signal.symbol] = signal.timestamp + timedelta(minutes=self.params.cooldown_minutes)
+        return closed
+
+
+def run_replay(strategy, prices, symbol="REPLAY"):
+    """
+    Historical replay driver: feeds prices through the strategy one bar at a
+    time and fills every affordable signal at the bar's close. Any open
+    position is closed at the final price. Returns (cash, trades) in the
+    format of run_bounceback_backtest.
+    """
+    cash = strategy.params.starting_cash
+    trades = []
+    columns = ["open", "high", "low", "close", "volume"]
+    for timestamp, bar in zip(prices.index, prices[columns].itertuples(index=False)):
+        signal = strategy.on_bar(symbol, timestamp, *bar)
+        if signal is None:
+            continue
+        if signal.side == "buy":
+            if cash >= signal.shares * signal.price:
+                cash -= signal.shares * signal.price
+                strategy.apply(signal)
+        else:
+            closed = strategy.apply(signal)
+            cash += closed["shares"] * signal.price
+            trades.append({
+                "buy_time": closed["entry_time"],
+                "buy_price": closed["entry_price"],
+                "sell_time": signal.timestamp,
+                "sell_price": signal.price,
+                "return_pct": signal.return_pct
+            })
+
+    closed = strategy.positions.pop(symbol, None)
+    if closed is not None:
+        final_price = prices["close"].iloc[-1]
+        cash += closed["shares"] * final_price
+        trades.append({
+            "buy_time": closed["entry_time"],
+            "buy_price": closed["entry_price"],
+            "sell_time": prices.index[-1],
+            "sell_price": final_price,
+            "return_pct": (final_price - closed["entry_price"]) / closed["entry_price"] * 100
+        })
+    return cash, trades
+
+
+def compare_results(expected, actual, rel_tol=1e-9):
+    """
+    First difference between two (cash, trades) backtest results, as a
+    message, or None when they match. Times must be equal; prices, returns
+    and cash may differ by float rounding.
+    """
+    (expected_cash, expected_trades), (actual_cash, actual_trades) = expected, actual
+    if len(expected_trades) != len(actual_trades):
+        return f"{len(expected_trades)} trades vs {len(actual_trades)}"
+    for n, (a, b) in enumerate(zip(expected_trades, actual_trades)):
+        for key in a:
+            same = a[key] == b[key] if key.endswith("_time") else math.isclose(a[key], b[key], rel_tol=rel_tol)
+            if not same:
+                return f"trade {n} {key}: {a[key]} vs {b[key]}"
+    if not math.isclose(expected_cash, actual_cash, rel_tol=rel_tol):
+        return f"final cash {expected_cash} vs {actual_cash}"
+    return None
@@ -0,0 +1,91 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import numpy as np
+
+from common.bouncebackengine import BouncebackFeatures, run_bounceback_backtest
+from common.parallelrunner import BACKTEST_WORKERS
+
+_features = None
+
+
+def param_grid(base, grid):
+    """Every combination of the values in grid ({field: [values]}) applied on top of base params."""
+    keys = list(grid)
+    return [replace(base, **dict(zip(keys, values))) for values in itertools.product(*grid.values())]
+
+
+def summarize(final_value, returns, starting_total):
+    """Same statistics as the backtests' TOTAL STRATEGY SUMMARY."""
+    avg_return = np.mean(returns) if returns else 0.0
+    std = np.std(returns) if returns else 0.0
+    return {
+        "final_value": final_value,
+        "total_return_pct": (final_value - starting_total) / starting_total * 100,
+        "trades": len(returns),
+        "win_rate": sum(r > 0 for r in returns) / len(returns) * 100 if returns else 0.0,
+        "avg_return": avg_return,
+        "sharpe": avg_return / std if std != 0 else 0,
+    }
+
+
+def build_features(prices_by_ticker, lookbacks):
+    """Features per ticker with the max-high column filled in for every lookback in the sweep."""
+    features = {}
+    for ticker, prices in prices_by_ticker.items():
+        features[ticker] = BouncebackFeatures(prices)
+        for lookback in lookbacks:
+            features[ticker].max_high(lookback)
+    return features
+
+
+def _set_features(features):
+    global _features
+    _features = features
+
+
+def evaluate(params, features=None, bounds=None):
+    """
+    Runs params over every ticker and returns its summary row. bounds
+    ({ticker: (start, stop)} bar positions) limits each ticker to a slice.
+    Indicators still come from the full series, so a slice needs no warm-up.
+    """
+    features = _features if features is None else features
+    final_value = 0
+    returns = []
+    for ticker, ticker_features in features.items():
+        start, stop = (0, None) if bounds is None else bounds[ticker]
+        cash, trades = run_bounceback_backtest(ticker_features, params, start, stop)
+        final_value += cash
+        returns.extend(t["return_pct"] for t in trades)
+    return summarize(final_value, returns, params.starting_cash * len(features))
+
+
+def _evaluate_job(job):
+    params, bounds = job
+    return evaluate(params, bounds=bounds)
+
+
+def sweep_pool(features, workers=BACKTEST_WORKERS):
+    """A process pool whose workers hold the features, for reuse across several run_sweep calls."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_set_features, initargs=(features,))
+
+
+def run_sweep(features, grid, workers=BACKTEST_WORKERS, bounds=None, pool=None):
+    """
+    Evaluates every params in grid and returns [(params, summary)] ranked by
+    final value. Features are sent to each worker once, when it starts, and
+    are never recomputed per combination. Pass a sweep_pool() to keep the
+    workers between calls.
+    """
+    jobs = [(params, bounds) for params in grid]
+    if pool is not None:
+        summaries = list(pool.map(_evaluate_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    elif workers <= 1 or len(grid) <= 1:
+        summaries = [evaluate(params, features, bounds) for params in grid]
+    else:
+        with sweep_pool(features, workers) as pool:
+            summaries = list(pool.map(_evaluate_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    ranked = list(zip(grid, summaries))
+    ranked.sort(key=lambda row: row[1]["final_value"], reverse=True)
+    return ranked
@@ -0,0 +1,56 @@
+import time
+import pytz
+
+FILLED_ORDERS_LIMIT = 500  # largest page the orders endpoint returns
+
+class BrokerSnapshot:
+    """
+    Account state for one strategy cycle, indexed by symbol. It makes one
+    positions call per refresh. It makes one filled-orders call, and only
+    the first time a cycle asks for a last buy time. This replaces a
+    get_position / list_orders round-trip per ticker. Works with the
+    alpaca_trade_api REST client of the 1-min and 5-min scripts.
+
+    max_age=0 refreshes on every refresh_if_stale().
+    """
+
+    def __init__(self, client, max_age=0):
+        self.client = client
+        self.max_age = max_age
+        self.positions = {}     # {symbol: (qty, avg_entry_price)}
+        self._last_buys = None  # {symbol: filled_at of the latest buy}, loaded on first use
+        self.refreshed_at = None
+
+    def refresh(self):
+        self.positions = {
+            p.symbol: (float(p.qty), float(p.avg_entry_price))
+            for p in self.client.list_positions()
+        }
+        self._last_buys = None
+        self.refreshed_at = time.time()
+
+    def refresh_if_stale(self):
+        if self.refreshed_at is None or time.time() - self.refreshed_at >= self.max_age:
+            self.refresh()
+
+    def qty(self, symbol):
+        return self.positions.get(symbol, (0.0, None))[0]
+
+    def entry_price(self, symbol):
+        return self.positions.get(symbol, (0.0, None))[1]
+
+    def last_buy_time(self, symbol):
+        if self._last_buys is None:
+            self._load_last_buys()
+        return self._last_buys.get(symbol)
+
+    def _load_last_buys(self):
+        self._last_buys = {}
+        try:
+            orders = self.client.list_orders(status="filled", limit=FILLED_ORDERS_LIMIT, direction="desc")
+        except Exception as e:
+            print(f"Error getting last buy times: {e}")
+            return
+        for order in orders:
+            if order.side == "buy" and order.symbol not in self._last_buys:
+                self._last_buys[order.symbol] = order.filled_at.astimezone(pytz.utc)
@@ -0,0 +1,86 @@
+import os
+import json
+from datetime import datetime
+from alpaca.trading.enums import OrderSide, TradeEvent
+
+FILL_LEDGER_FILE = os.getenv("FILL_LEDGER_FILE", "fills.json")
+
+FILL_EVENTS = {TradeEvent.FILL, TradeEvent.PARTIAL_FILL}
+
+
+class FillLedger:
+    """
+    Actual fills per held symbol, built from the broker's trade-updates
+    stream: quantity, average fill price, and the time of the first fill
+    that opened the position. The ledger is saved to `path` after every
+    fill, so entry times survive restarts. The positions endpoint does not
+    return them.
+    """
+
+    def __init__(self, path=FILL_LEDGER_FILE):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = {
+                        symbol: {**entry, "entry_time": datetime.fromisoformat(entry["entry_time"])}
+                        for symbol, entry in json.load(f).items()
+                    }
+            except Exception as e:
+                print(f"[WARN] Ignoring unreadable fill ledger {path}: {e}")
+
+    def get(self, symbol):
+        """{"qty", "avg_price", "entry_time"} for a held symbol, or None."""
+        return self.entries.get(symbol)
+
+    def apply(self, update):
+        """Records a trade update. Returns the symbol's entry after a fill, or None if it is now flat or the event is not a fill."""
+        if update.event not in FILL_EVENTS:
+            return None
+        symbol = update.order.symbol
+        fill_qty = float(update.qty)
+        price = float(update.price)
+        entry = self.entries.get(symbol)
+
+        if update.order.side == OrderSide.BUY:
+            if entry is None:
+                entry = {"qty": 0.0, "avg_price": price, "entry_time": update.timestamp}
+            qty = entry["qty"] + fill_qty
+            entry = {**entry, "qty": qty, "avg_price": (entry["qty"] * entry["avg_price"] + fill_qty * price) / qty}
+            self.entries[symbol] = entry
+        elif entry is not None:
+            entry = {**entry, "qty": entry["qty"] - fill_qty}
+            if entry["qty"] > 0:
+                self.entries[symbol] = entry
+            else:
+                entry = None
+                self.entries.pop(symbol)
+
+        # The broker's running position is authoritative when the event carries it
+        if update.position_qty is not None and symbol in self.entries:
+            if float(update.position_qty) > 0:
+                self.entries[symbol]["qty"] = float(update.position_qty)
+            else:
+                entry = None
+                self.entries.pop(symbol)
+        self.save()
+        return entry
+
+    def reconcile(self, held_symbols):
+        """Drops entries for symbols the broker no longer holds (fills missed while offline)."""
+        stale = [symbol for symbol in self.entries if symbol not in held_symbols]
+        for symbol in stale:
+            del self.entries[symbol]
+        if stale:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(
+                {symbol: {**entry, "entry_time": entry["entry_time"].isoformat()} for symbol, entry in self.entries.items()},
+                f,
+            )
+        os.replace(self.path + ".tmp", self.path)
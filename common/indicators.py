@@ -0,0 +1,110 @@
+from collections import deque
+import math
+
+
+class RollingMax:
+    """Max of the last `window` values, O(1) amortized per update (monotonic deque)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self._candidates = deque()  # (position, value), values strictly decreasing
+
+    def _dominates(self, kept, new):
+        return kept > new
+
+    def update(self, value):
+        while self._candidates and not self._dominates(self._candidates[-1][1], value):
+            self._candidates.pop()
+        self._candidates.append((self.count, value))
+        self.count += 1
+        if self._candidates[0][0] <= self.count - 1 - self.window:
+            self._candidates.popleft()
+        return self.value
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    @property
+    def value(self):
+        return self._candidates[0][1] if self._candidates else math.nan
+
+
+class RollingMin(RollingMax):
+    """Min of the last `window` values, O(1) amortized per update."""
+
+    def _dominates(self, kept, new):
+        return kept < new
+
+
+class RollingSMA:
+    """
+    Simple moving average over a fixed window. The running sum uses the same
+    Kahan-compensated add/remove steps as pandas' rolling().mean(), so values
+    match the vectorized backtest bit for bit, and compensation keeps float
+    drift from accumulating.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self._values = deque()
+        self._sum = 0.0
+        self._add_compensation = 0.0
+        self._remove_compensation = 0.0
+        self._same_run = 0        # trailing run of equal values, whose mean is exact
+        self._last = None
+
+    def update(self, value):
+        self._values.append(value)
+        if len(self._values) > self.window:
+            y = -self._values.popleft() - self._remove_compensation
+            t = self._sum + y
+            self._remove_compensation = t - self._sum - y
+            self._sum = t
+        y = value - self._add_compensation
+        t = self._sum + y
+        self._add_compensation = t - self._sum - y
+        self._sum = t
+        self._same_run = self._same_run + 1 if value == self._last else 1
+        self._last = value
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self):
+        return len(self._values) >= self.window
+
+    @property
+    def value(self):
+        if not self.ready:
+            return math.nan
+        if self._same_run >= self.window:
+            return self._last
+        return self._sum / self.window
+
+
+class ATR:
+    """Average true range as an SMA of true range. Pass high=low=close for close-only TR."""
+
+    def __init__(self, window):
+        self.window = window
+        self._tr = RollingSMA(window)
+        self._prev_close = None
+
+    def update(self, high, low, close):
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        return self._tr.update(true_range)
+
+    @property
+    def ready(self):
+        return self._tr.ready
+
+    @property
+    def value(self):
+        return self._tr.value
@@ -0,0 +1,161 @@
+import os
+import math
+import time
+import asyncio
+
+LATENCY_DUMP_SECONDS = int(os.getenv("LATENCY_DUMP_SECONDS", "300"))
+BAR_SECONDS = 60  # minute bars are stamped with their open and complete a minute later
+FILL_MATCH_SECONDS = 600  # acks and fills not matched within this long are dropped (cancels, foreign orders)
+
+# Hot-path stages, in order
+STAGES = {
+    "bar_delay": "Bar close → received",
+    "decision": "Received → decision",
+    "order_ack": "Decision → order acked",
+    "fill": "Order acked → filled",
+}
+
+GROWTH = 1.01
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram. Samples are counted in logarithmic microsecond
+    buckets GROWTH apart. Any percentile is then within about 1% of the true
+    value, and memory stays at a few hundred counters however many samples
+    are recorded.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        seconds = max(seconds, 0.0)
+        us = seconds * 1e6
+        index = int(math.log(us) / _LOG_GROWTH) + 1 if us >= 1 else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct):
+        """Upper edge of the bucket holding the pct-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(GROWTH ** index / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class LatencyRecorder:
+    """
+    Times every bar through handle_bar → process_new_bar → submit_order, per
+    stage and per symbol. Timestamps are taken on the event loop, and
+    recording only updates a histogram's counters. This is cheap enough to
+    leave on for live trading.
+
+    When fills come from the trade-updates stream, the fill stage is matched
+    by order id: order_acked() from the executor, order_filled() from the
+    trade-updates handler, in either order.
+    """
+
+    def __init__(self, track_bar_delay=True):
+        self.track_bar_delay = track_bar_delay  # off for replays, whose bar timestamps are historical
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.by_symbol = {}
+        self._received_at = {}
+        self._acked = {}    # order id -> (symbol, acked_at) waiting for its fill
+        self._filled = {}   # order id -> filled_at for fills that beat their ack
+
+    def record(self, stage, symbol, seconds):
+        self.stages[stage].record(seconds)
+        self.by_symbol.setdefault(symbol, {}).setdefault(stage, LatencyHistogram()).record(seconds)
+
+    def bar_received(self, symbol, bar_timestamp):
+        self._received_at[symbol] = time.perf_counter()
+        if self.track_bar_delay:
+            self.record("bar_delay", symbol, time.time() - bar_timestamp.timestamp() - BAR_SECONDS)
+
+    def decided(self, symbol):
+        """Marks the strategy decision for symbol's current bar and returns its perf_counter() time."""
+        decided_at = time.perf_counter()
+        received_at = self._received_at.get(symbol)
+        if received_at is not None:
+            self.record("decision", symbol, decided_at - received_at)
+        return decided_at
+
+    def order_acked(self, order_id, symbol, acked_at):
+        filled_at = self._filled.pop(str(order_id), None)
+        if filled_at is not None:
+            self.record("fill", symbol, filled_at - acked_at)
+        else:
+            self._expire(self._acked, lambda pending: pending[1])
+            self._acked[str(order_id)] = (symbol, acked_at)
+
+    def order_filled(self, order_id):
+        """Call on the final fill event of an order."""
+        filled_at = time.perf_counter()
+        pending = self._acked.pop(str(order_id), None)
+        if pending is not None:
+            symbol, acked_at = pending
+            self.record("fill", symbol, filled_at - acked_at)
+        else:
+            self._expire(self._filled, lambda filled: filled)
+            self._filled[str(order_id)] = filled_at
+
+    @staticmethod
+    def _expire(pending, time_of):
+        cutoff = time.perf_counter() - FILL_MATCH_SECONDS
+        for order_id in [order_id for order_id, value in pending.items() if time_of(value) < cutoff]:
+            del pending[order_id]
+
+    def slowest_symbols(self, stage, n=5):
+        rows = [(symbol, stages[stage]) for symbol, stages in self.by_symbol.items() if stage in stages]
+        rows.sort(key=lambda row: row[1].percentile(99), reverse=True)
+        return rows[:n]
+
+    def report(self):
+        lines = ["[LATENCY] ms          count      p50      p90      p99      max"]
+        for stage, label in STAGES.items():
+            histogram = self.stages[stage]
+            if not histogram.count:
+                continue
+            lines.append(
+                f"[LATENCY] {label:<24} {histogram.count:>8} "
+                + " ".join(f"{histogram.percentile(p) * 1000:>8.2f}" for p in (50, 90, 99))
+                + f" {histogram.max * 1000:>8.2f}"
+            )
+        if self.stages["bar_delay"].count:
+            slowest = ", ".join(
+                f"{symbol} {histogram.percentile(99) * 1000:.0f}"
+                for symbol, histogram in self.slowest_symbols("bar_delay")
+            )
+            lines.append(f"[LATENCY] Latest bars (p99 ms): {slowest}")
+        if len(lines) == 1:
+            lines.append("[LATENCY] No samples yet.")
+        return "\n".join(lines)
+
+    async def dump_loop(self, write, interval=LATENCY_DUMP_SECONDS):
+        """Writes the running report every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            write(self.report())
@@ -0,0 +1,52 @@
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+import pytz
+
+# Seconds to wait past each minute boundary so the minute's bar is published first
+MINUTE_DELAY_SECONDS = float(os.getenv("MINUTE_DELAY_SECONDS", "2"))
+
+
+def run_every_minute(job, until=None, delay_seconds=MINUTE_DELAY_SECONDS):
+    """
+    Calls job() delay_seconds after every minute boundary until `until`
+    (an aware datetime) or SIGINT/SIGTERM. A run that overruns its minute
+    skips the boundaries it missed rather than queuing them. An exception
+    in job is logged and the loop carries on. Clients, connection pools and
+    anything else the job keeps at module level stay warm between runs.
+    """
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    runs = skipped = 0
+    durations = []
+    while not stop.is_set():
+        now = time.time()
+        next_run = (now - delay_seconds) // 60 * 60 + 60 + delay_seconds
+        if until is not None and next_run >= until.timestamp():
+            break
+        if stop.wait(next_run - now):
+            break
+
+        started = time.time()
+        print(f"\n[SCHED] Run at {datetime.fromtimestamp(started, pytz.UTC):%H:%M:%S} UTC "
+              f"(woke {(started - next_run) * 1000:.0f} ms late)")
+        try:
+            job()
+        except Exception as e:
+            print(f"[ERROR] Scheduled run failed: {e}")
+        finished = time.time()
+        runs += 1
+        durations.append(finished - started)
+
+        missed = int((finished - delay_seconds) // 60 - (started - delay_seconds) // 60)
+        if missed:
+            skipped += missed
+            print(f"[SCHED] Run took {finished - started:.1f}s, skipping {missed} minute(s)")
+
+    if durations:
+        print(f"[SCHED] Stopped after {runs} runs ({skipped} minutes skipped) | "
+              f"avg {sum(durations) / len(durations):.2f}s | max {max(durations):.2f}s per run")
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+
+def build_panel(prices_by_symbol):
+    """Aligns each symbol's close series into one timestamp x symbol matrix, NaN where a symbol has no bar."""
+    return pd.DataFrame({symbol: prices["close"] for symbol, prices in prices_by_symbol.items()}).sort_index()
+
+
+def panel_momentum(panel):
+    """
+    Percent change from each symbol's previous bar, computed for the whole
+    matrix at once. Gaps in other symbols are skipped over. This is
+    pct_change on the forward-filled panel, written as (now - then) / then
+    so values match the per-row loop bit for bit.
+    """
+    prev = panel.ffill().shift()
+    return ((panel - prev) / prev * 100).where(panel.notna())
+
+
+def run_momentum_panel(panel, position_size, momentum_threshold, cooldown_minutes, starting_cash=10000.0):
+    """
+    Runs the 1-min momentum rules for every symbol together, in one scan
+    over the timestamps. Each step updates the position, cash and
+    last-buy arrays of all symbols with vector operations.
+
+    A holding sells when momentum <= 0. A flat symbol buys when momentum >
+    momentum_threshold and any cooldown since its last buy has passed.
+
+    Returns (equity, trades). equity is a timestamp x symbol matrix of
+    portfolio values on each symbol's bars, from its second bar on, NaN
+    elsewhere. trades is a DataFrame of (time, symbol, action, price,
+    shares) rows, ordered by symbol and then time.
+    """
+    symbols = list(panel.columns)
+    close = panel.to_numpy(dtype=float)
+    momentum = panel_momentum(panel).to_numpy(dtype=float)
+    times = panel.index
+    ns = times.asi8
+    cooldown_ns = int(cooldown_minutes * 60 * 1e9)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares_if_bought = np.where(np.isnan(close), 0, np.floor(position_size / close))
+
+    cash = np.full(len(symbols), float(starting_cash))
+    position = np.zeros(len(symbols))
+    last_buy_ns = np.full(len(symbols), np.iinfo(np.int64).min)
+    has_last_buy = np.zeros(len(symbols), dtype=bool)
+    equity = np.full(close.shape, np.nan)
+    events = []  # (row, symbol columns, action, shares) per step with trades
+
+    for t in range(len(times)):
+        price = close[t]
+        mom = momentum[t]
+        active = ~np.isnan(mom)
+        if not active.any():
+            continue
+
+        sell = active & (position > 0) & (mom <= 0)
+        buy = (
+            active & ~sell & (position == 0) & (mom > momentum_threshold) &
+            (~has_last_buy | (ns[t] - last_buy_ns >= cooldown_ns)) &
+            (shares_if_bought[t] > 0)
+        )
+
+        if sell.any():
+            events.append((t, np.flatnonzero(sell), "SELL", position[sell]))
+        cash[sell] += position[sell] * price[sell]
+        position[sell] = 0
+        has_last_buy[sell] = False
+
+        if buy.any():
+            events.append((t, np.flatnonzero(buy), "BUY", shares_if_bought[t, buy]))
+        cash[buy] -= shares_if_bought[t, buy] * price[buy]
+        position[buy] = shares_if_bought[t, buy]
+        last_buy_ns[buy] = ns[t]
+        has_last_buy[buy] = True
+
+        equity[t, active] = cash[active] + position[active] * price[active]
+
+    return pd.DataFrame(equity, index=times, columns=symbols), _trade_frame(events, times, symbols, close)
+
+
+def _trade_frame(events, times, symbols, close):
+    columns = ["time", "symbol", "action", "price", "shares"]
+    if not events:
+        return pd.DataFrame(columns=columns)
+    rows = np.concatenate([np.full(len(cols), t) for t, cols, _, _ in events])
+    cols = np.concatenate([cols for _, cols, _, _ in events])
+    trades = pd.DataFrame({
+        "time": times[rows],
+        "symbol": np.asarray(symbols, dtype=object)[cols],
+        "action": np.concatenate([np.full(len(cols), action, dtype=object) for _, cols, action, _ in events]),
+        "price": close[rows, cols],
+        "shares": np.concatenate([shares for _, _, _, shares in events]).astype(int),
+        "_col": cols,
+    })
+    return trades.sort_values(["_col", "time"], kind="stable").drop(columns="_col").reset_index(drop=True)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from alpaca.trading.enums import OrderStatus
+
+ORDER_WORKERS = 4
+FILL_POLL_SECONDS = 0.5
+FILL_TIMEOUT_SECONDS = 10
+
+FINAL_STATUSES = {
+    OrderStatus.FILLED,
+    OrderStatus.CANCELED,
+    OrderStatus.EXPIRED,
+    OrderStatus.REJECTED,
+    OrderStatus.DONE_FOR_DAY,
+}
+
+
+def order_failed(order, error):
+    """True when the order errored or ended without a fill."""
+    return error is not None or (order.status in FINAL_STATUSES and order.status != OrderStatus.FILLED)
+
+
+class AsyncOrderExecutor:
+    """
+    Keeps broker round-trips off the event loop. submit() only enqueues, and
+    worker tasks send the blocking TradingClient calls to a thread pool (the
+    client's requests session reuses its connections). Orders for the same
+    symbol go out one at a time and in order. on_done(order, error) is called
+    on the event loop once the order fills, reaches another final status,
+    stops being polled, or fails. With a LatencyRecorder, orders submitted
+    with their decided_at time also record the order_ack and fill stages.
+    With poll_fills=False the order is reported as soon as the broker
+    accepts it. Use this when fills come from the trade-updates stream; the
+    handler then calls latency.order_filled(order_id) to close the fill stage.
+    """
+
+    def __init__(self, trading_client, workers=ORDER_WORKERS, latency=None, poll_fills=True):
+        self.trading_client = trading_client
+        self.workers = workers
+        self.latency = latency
+        self.poll_fills = poll_fills
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orders")
+        self._queue = None
+        self._tasks = []
+        self._symbol_locks = {}
+
+    def start(self):
+        """Must be called from the running event loop before the first submit()."""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, request, on_done=None, decided_at=None):
+        self._queue.put_nowait((request, on_done, decided_at))
+
+    def _submit_and_wait(self, request):
+        order = self.trading_client.submit_order(request)
+        acked_at = time.perf_counter()
+        deadline = time.monotonic() + FILL_TIMEOUT_SECONDS
+        while self.poll_fills and order.status not in FINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(FILL_POLL_SECONDS)
+            order = self.trading_client.get_order_by_id(order.id)
+        return order, acked_at, time.perf_counter()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            request, on_done, decided_at = await self._queue.get()
+            try:
+                order, error = None, None
+                async with self._symbol_locks.setdefault(request.symbol, asyncio.Lock()):
+                    try:
+                        order, acked_at, done_at = await loop.run_in_executor(self._pool, self._submit_and_wait, request)
+                    except Exception as e:
+                        error = e
+                    else:
+                        if self.latency is not None and decided_at is not None:
+                            self.latency.record("order_ack", request.symbol, acked_at - decided_at)
+                            if not self.poll_fills:
+                                self.latency.order_acked(order.id, request.symbol, acked_at)
+                            elif order.status == OrderStatus.FILLED:
+                                self.latency.record("fill", request.symbol, done_at - acked_at)
+                if on_done is not None:
+                    on_done(order, error)
+            except Exception as e:
+                print(f"[ORDER ERROR] {request.symbol}: callback failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self):
+        """Waits until every queued order has been submitted and reported."""
+        await self._queue.join()
+
+    async def close(self):
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,31 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+
+
+def _call(worker, ticker):
+    try:
+        return worker(ticker), None
+    except Exception as e:
+        # Sent back as text: not every client exception survives pickling
+        return None, str(e)
+
+
+def run_tickers(worker, tickers, workers=BACKTEST_WORKERS):
+    """
+    Runs worker(ticker) for every ticker across a process pool and yields
+    (ticker, result, error) in ticker order. Each ticker is fetched and
+    simulated inside its worker, so downloads and compute overlap. worker must
+    be a module-level function so it can be pickled. With workers <= 1
+    everything runs inline.
+    """
+    if workers <= 1 or len(tickers) <= 1:
+        for ticker in tickers:
+            yield (ticker, *_call(worker, ticker))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tickers))) as pool:
+        futures = [pool.submit(_call, worker, ticker) for ticker in tickers]
+        for ticker, future in zip(tickers, futures):
+            yield (ticker, *future.result())
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+
+# Backend for the forward tests' position log: "firestore" (default) or "sqlite" for offline runs
+POSITION_STORE = os.getenv("POSITION_STORE", "firestore").lower()
+POSITION_SQLITE_PATH = os.getenv(
+    "POSITION_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".positionstore", "positions.db"),
+)
+# Optional JSON file mirroring the last Firestore state, for hosts that keep files between runs
+POSITION_CACHE_FILE = os.getenv("POSITION_CACHE_FILE")
+# A cached copy older than this is re-read from Firestore, in case another process wrote to it
+POSITION_CACHE_SECONDS = int(os.getenv("POSITION_CACHE_SECONDS", "900"))
+
+FIRESTORE_BATCH_LIMIT = 500  # max writes per WriteBatch
+
+
+class PositionStore(ABC):
+    """
+    Keeps the last loaded or saved state of the position log. save() then
+    writes only the tickers that were added, changed or removed since then,
+    so a quiet minute costs no writes at all. Backends implement _read_all()
+    and _write(changed, deleted).
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._loaded_at = 0.0
+
+    def load(self):
+        """Returns {ticker: entry} as a fresh dict that the caller may modify freely."""
+        if self._snapshot is None or time.time() - self._loaded_at > self._max_age():
+            self._snapshot = self._read_all()
+            self._loaded_at = time.time()
+        return {ticker: dict(entry) for ticker, entry in self._snapshot.items()}
+
+    def save(self, log):
+        snapshot = self._snapshot or {}
+        changed = {ticker: dict(entry) for ticker, entry in log.items() if snapshot.get(ticker) != entry}
+        deleted = [ticker for ticker in snapshot if ticker not in log]
+        if changed or deleted:
+            self._write(changed, deleted)
+            print(f"[POSITIONS] Saved {len(changed)} changed, {len(deleted)} removed")
+        self._snapshot = {ticker: dict(entry) for ticker, entry in log.items()}
+
+    def _max_age(self):
+        return float("inf")
+
+    @abstractmethod
+    def _read_all(self):
+        """Returns the whole stored log as {ticker: entry}."""
+
+    @abstractmethod
+    def _write(self, changed, deleted):
+        """Writes the changed {ticker: entry} items and removes the deleted tickers."""
+
+
+class FirestorePositionStore(PositionStore):
+    """One document per ticker. Changes go out in WriteBatch commits."""
+
+    def __init__(self, db, collection="positions", cache_file=POSITION_CACHE_FILE, max_age=POSITION_CACHE_SECONDS):
+        super().__init__()
+        self.db = db
+        self.collection = db.collection(collection)
+        self.cache_file = cache_file
+        self.max_age = max_age
+
+    def _max_age(self):
+        return self.max_age
+
+    def _read_all(self):
+        if self.cache_file and os.path.exists(self.cache_file):
+            age = time.time() - os.path.getmtime(self.cache_file)
+            if age <= self.max_age:
+                try:
+                    with open(self.cache_file) as f:
+                        return json.load(f)
+                except Exception as e:
+                    print(f"[WARN] Ignoring unreadable position cache: {e}")
+        log = {doc.id: doc.to_dict() for doc in self.collection.stream()}
+        self._write_cache(log)
+        return log
+
+    def _write(self, changed, deleted):
+        ops = [(ticker, entry) for ticker, entry in changed.items()] + [(ticker, None) for ticker in deleted]
+        for i in range(0, len(ops), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for ticker, entry in ops[i:i + FIRESTORE_BATCH_LIMIT]:
+                if entry is None:
+                    batch.delete(self.collection.document(ticker))
+                else:
+                    batch.set(self.collection.document(ticker), entry)
+            batch.commit()
+
+    def save(self, log):
+        super().save(log)
+        self._write_cache(self._snapshot)
+
+    def _write_cache(self, log):
+        if not self.cache_file:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        with open(self.cache_file + ".tmp", "w") as f:
+            json.dump(log, f, default=float)
+        os.replace(self.cache_file + ".tmp", self.cache_file)
+
+
+class SqlitePositionStore(PositionStore):
+    """Local single-file backend, so a forward test can run without Firebase."""
+
+    def __init__(self, path=POSITION_SQLITE_PATH):
+        super().__init__()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS positions (ticker TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _read_all(self):
+        return {ticker: json.loads(data) for ticker, data in self.conn.execute("SELECT ticker, data FROM positions")}
+
+    def _write(self, changed, deleted):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO positions (ticker, data) VALUES (?, ?)",
+                [(ticker, json.dumps(entry, default=float)) for ticker, entry in changed.items()],
+            )
+            self.conn.executemany("DELETE FROM positions WHERE ticker = ?", [(ticker,) for ticker in deleted])
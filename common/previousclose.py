@@ -0,0 +1,106 @@
+import os
+import re
+import json
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+
+from common.tradingcalendar import eastern, previous_session, session_bounds
+
+# The last hour of the previous session is kept as <PREVIOUS_CLOSE_DIR>/<date>.parquet, with a
+# <date>.json sidecar listing every symbol already requested (with or without bars).
+PREVIOUS_CLOSE_DIR = os.getenv(
+    "PREVIOUS_CLOSE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".previousclose"),
+)
+
+PREVIOUS_CLOSE_WINDOW = timedelta(hours=1)
+
+# Only files named like the ones this service writes are ever cleaned up
+_SESSION_FILE = re.compile(r"^\d{4}-\d{2}-\d{2}\.(parquet|json)$")
+
+
+class PreviousCloseService:
+    """
+    Bars from the last hour of the previous trading session, used to pad
+    short lookback windows early in the day. The session comes from the
+    trading calendar, so weekends, holidays and early closes need no
+    probing. Missing symbols are fetched in one batched request and the
+    result is memoized for the whole trading day, in memory and on disk
+    (root=None keeps it in memory only). A cron job started every minute
+    fetches each symbol once a day only if root survives between runs, as
+    on a self-hosted agent. GitHub-hosted runners start from a fresh
+    checkout every job, so there the memo only helps a long-running daemon.
+    fetch_batch(symbols, start, end) must return {symbol: DataFrame}.
+    """
+
+    def __init__(self, fetch_batch, root=PREVIOUS_CLOSE_DIR, window=PREVIOUS_CLOSE_WINDOW):
+        self.fetch_batch = fetch_batch
+        self.root = root
+        self.window = window
+        self.session_day = None
+        self.bars = {}           # {symbol: DataFrame} for session_day
+        self.requested = set()   # symbols already asked for, including those without bars
+
+    def _paths(self, day):
+        return (
+            os.path.join(self.root, f"{day.isoformat()}.parquet"),
+            os.path.join(self.root, f"{day.isoformat()}.json"),
+        )
+
+    def _load(self, day):
+        self.session_day = day
+        self.bars = {}
+        self.requested = set()
+        if not self.root:
+            return
+        bars_path, meta_path = self._paths(day)
+        if not (os.path.exists(bars_path) and os.path.exists(meta_path)):
+            return
+        try:
+            with open(meta_path) as f:
+                requested = set(json.load(f)["requested"])
+            stored = pd.read_parquet(bars_path)
+            bars = {symbol: group.droplevel(0) for symbol, group in stored.groupby(level=0, sort=False)}
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable previous close data for {day}: {e}")
+            return
+        self.bars, self.requested = bars, requested
+
+    def _save(self):
+        if not self.root:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        bars_path, meta_path = self._paths(self.session_day)
+        if self.bars:
+            pd.concat(self.bars, names=["symbol"]).to_parquet(bars_path + ".tmp")
+        else:
+            pd.DataFrame().to_parquet(bars_path + ".tmp")
+        os.replace(bars_path + ".tmp", bars_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"requested": sorted(self.requested)}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        # Earlier sessions are never asked for again
+        keep = {os.path.basename(path) for path in (bars_path, meta_path)}
+        for name in os.listdir(self.root):
+            if name not in keep and _SESSION_FILE.match(name):
+                os.remove(os.path.join(self.root, name))
+
+    def get(self, symbols, now=None):
+        """Returns {symbol: DataFrame} of previous-session close bars; symbols without bars are absent."""
+        now = now or datetime.now(pytz.UTC)
+        day = previous_session(now.astimezone(eastern).date())
+        if day != self.session_day:
+            self._load(day)
+
+        missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.requested]
+        if missing:
+            _, end = session_bounds(day)
+            start = end - self.window
+            print(f"[INFO] Fetching previous close data for {len(missing)} tickers from {start.strftime('%A %Y-%m-%d')}")
+            self.bars.update(self.fetch_batch(missing, start, end))
+            self.requested.update(missing)
+            self._save()
+
+        return {symbol: self.bars[symbol] for symbol in symbols if symbol in self.bars}
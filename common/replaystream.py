@@ -0,0 +1,184 @@
+import os
+import time
+import types
+import asyncio
+from datetime import timedelta
+import pandas as pd
+from alpaca.data.timeframe import TimeFrame
+from alpaca.trading.enums import OrderSide, OrderStatus, TradeEvent
+
+# Setting REPLAY_START (e.g. 2025-06-02) switches the stream bots to an offline replay
+REPLAY_START = os.getenv("REPLAY_START")
+REPLAY_END = os.getenv("REPLAY_END")            # defaults to one day after REPLAY_START
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "0"))  # 1 = real time, 60 = a minute per second, 0 = as fast as possible
+REPLAY_HISTORY_DAYS = 7
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+class ReplayBar:
+    """Same attributes the handlers read from alpaca's Bar."""
+
+    __slots__ = ("symbol", "timestamp", "open", "high", "low", "close", "volume")
+
+    def __init__(self, symbol, timestamp, open, high, low, close, volume):
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+
+class ReplayDataStream:
+    """
+    Drop-in for StockDataStream that serves stored minute bars from the bar
+    cache through the same subscribe_bars()/_run_forever() interface. Bars of
+    all subscribed symbols are merged in timestamp order, and each minute is
+    released speed times faster than real time. A speed of 0 releases them as
+    fast as the handlers keep up. If settle is set (an async callable, e.g.
+    the order executor's drain), it is awaited before each new minute, the
+    same way a live minute gives orders time to go out.
+    """
+
+    def __init__(self, bar_cache, start, end=None, speed=REPLAY_SPEED, feed="sip"):
+        self.bar_cache = bar_cache
+        self.start = _utc(start)
+        self.end = _utc(end) if end else self.start + timedelta(days=1)
+        self.speed = speed
+        self.feed = feed
+        self._handlers = {}
+        self.last_close = {}
+        self.last_timestamp = {}
+        self.settle = None
+
+    def subscribe_bars(self, handler, *symbols):
+        for symbol in symbols:
+            self._handlers[symbol] = handler
+
+    def history(self, symbol, n):
+        """The n bars before the replay starts, for warming up indicators."""
+        bars = self.bar_cache.get_bars(
+            symbol, self.start - timedelta(days=REPLAY_HISTORY_DAYS), self.start, TimeFrame.Minute, self.feed
+        )
+        return bars[bars.index < self.start].tail(n)
+
+    def _load(self):
+        frames = []
+        for symbol in self._handlers:
+            bars = self.bar_cache.get_bars(symbol, self.start, self.end, TimeFrame.Minute, self.feed)
+            bars = bars[bars.index < self.end]
+            if not bars.empty:
+                frames.append(bars[BAR_FIELDS].assign(symbol=symbol))
+        if not frames:
+            return None
+        return pd.concat(frames).sort_index(kind="stable")
+
+    async def _run_forever(self):
+        bars = self._load()
+        if bars is None:
+            print("[REPLAY] No stored bars for the subscribed symbols in the replay window.")
+            return
+
+        print(f"[REPLAY] {len(bars)} bars for {bars['symbol'].nunique()} symbols "
+              f"{self.start:%Y-%m-%d %H:%M} → {self.end:%Y-%m-%d %H:%M} UTC")
+        ns = bars.index.asi8
+        timestamps = bars.index
+        values = bars[BAR_FIELDS].to_numpy(dtype=float)
+        symbols = bars["symbol"].to_numpy()
+
+        started = time.perf_counter()
+        previous_ns = None
+        for i in range(len(bars)):
+            if ns[i] != previous_ns:
+                if previous_ns is not None:
+                    if self.settle is not None:
+                        await self.settle()
+                    # Yield between minutes even at full speed so order workers can run
+                    await asyncio.sleep((ns[i] - previous_ns) / 1e9 / self.speed if self.speed > 0 else 0)
+                previous_ns = ns[i]
+
+            bar = ReplayBar(symbols[i], timestamps[i], *values[i])
+            self.last_close[bar.symbol] = bar.close
+            self.last_timestamp[bar.symbol] = bar.timestamp
+            await self._handlers[bar.symbol](bar)
+
+        elapsed = time.perf_counter() - started
+        print(f"[REPLAY] Done: {len(bars)} bars in {elapsed:.2f}s ({len(bars) / max(elapsed, 1e-9):.0f} bars/s)")
+
+
+class FakeTradingClient:
+    """
+    Broker for replays. Market orders fill at once at the symbol's last
+    replayed close. It also stands in for TradingStream: each fill is sent
+    as a trade update to the subscribed handler on the event loop.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.orders = {}
+        self.positions = {}
+        self._trade_handler = None
+        self._loop = None
+
+    def subscribe_trade_updates(self, handler):
+        """Must be called from the running event loop."""
+        self._trade_handler = handler
+        self._loop = asyncio.get_running_loop()
+
+    async def _run_forever(self):
+        pass  # fills are pushed from submit_order()
+
+    def submit_order(self, request):
+        symbol = request.symbol
+        qty = float(request.qty)
+        price = self.stream.last_close.get(symbol)
+        held = self.positions.get(symbol, {"qty": 0.0, "avg_entry_price": price})
+        if request.side == OrderSide.BUY:
+            total = held["qty"] + qty
+            held = {"qty": total, "avg_entry_price": (held["qty"] * held["avg_entry_price"] + qty * price) / total}
+        else:
+            held = {"qty": held["qty"] - qty, "avg_entry_price": held["avg_entry_price"]}
+        if held["qty"]:
+            self.positions[symbol] = held
+        else:
+            self.positions.pop(symbol, None)
+
+        order = types.SimpleNamespace(
+            id=str(len(self.orders) + 1),
+            symbol=symbol,
+            side=request.side,
+            qty=qty,
+            filled_qty=qty,
+            filled_avg_price=price,
+            status=OrderStatus.FILLED,
+        )
+        self.orders[order.id] = order
+
+        if self._trade_handler is not None:
+            update = types.SimpleNamespace(
+                event=TradeEvent.FILL,
+                order=order,
+                timestamp=self.stream.last_timestamp.get(symbol),
+                price=price,
+                qty=qty,
+                position_qty=held["qty"],
+            )
+            # submit_order runs on an executor thread
+            self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._trade_handler(update)))
+        return order
+
+    def get_order_by_id(self, order_id):
+        return self.orders[order_id]
+
+    def get_all_positions(self):
+        return [
+            types.SimpleNamespace(symbol=symbol, qty=str(held["qty"]), avg_entry_price=str(held["avg_entry_price"]))
+            for symbol, held in self.positions.items()
+        ]
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_epoch_ns(timestamp):
+    if isinstance(timestamp, pd.Timestamp):
+        return timestamp.value
+    delta = timestamp - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+
+
+class BarRingBuffer:
+    """
+    Fixed-capacity OHLCV store for one symbol. Every bar is written twice
+    (slot and slot + capacity) so the newest `capacity` bars are always one
+    contiguous slice, which makes window() a zero-copy NumPy view.
+    """
+
+    FIELDS = ("open", "high", "low", "close", "volume")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(self.FIELDS), 2 * capacity), dtype=np.float64)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, open, high, low, close, volume):
+        slot = self.count % self.capacity
+        ts = to_epoch_ns(timestamp)
+        self._timestamps[slot] = ts
+        self._timestamps[slot + self.capacity] = ts
+        row = (open, high, low, close, volume)
+        self._values[:, slot] = row
+        self._values[:, slot + self.capacity] = row
+        self.count += 1
+
+    def extend_frame(self, df):
+        for ts, row in zip(df.index, df[list(self.FIELDS)].itertuples(index=False)):
+            self.append(ts, *row)
+
+    def _span(self, n):
+        size = len(self) if n is None else min(n, len(self))
+        end = (self.count - 1) % self.capacity + self.capacity + 1
+        return end - size, end
+
+    def window(self, field, n=None):
+        """The newest n values of a field, oldest first, as a read-only view."""
+        start, end = self._span(n)
+        view = self._values[self.FIELDS.index(field), start:end]
+        view.flags.writeable = False
+        return view
+
+    def timestamps(self, n=None):
+        start, end = self._span(n)
+        view = self._timestamps[start:end]
+        view.flags.writeable = False
+        return view
+
+    def last(self, field):
+        return self._values[self.FIELDS.index(field), (self.count - 1) % self.capacity]
+
+    def to_frame(self, n=None):
+        """Copy of the newest n bars as a DataFrame, for debugging output."""
+        if not len(self):
+            return pd.DataFrame(columns=list(self.FIELDS))
+        start, end = self._span(n)
+        index = pd.DatetimeIndex(self._timestamps[start:end].copy(), tz="UTC", name="timestamp")
+        return pd.DataFrame(self._values[:, start:end].T.copy(), index=index, columns=list(self.FIELDS))
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+EXIT_LABELS = ("DYNAMIC STOP SELL", "TAKE-PROFIT SELL", "SMA TIME SELL")
+
+
+@dataclass(frozen=True)
+class SmaBreakoutParams:
+    starting_cash: float
+    momentum_threshold: float
+    position_size: float
+    hold_duration_minutes: float
+    take_profit_pct: float
+    sma_fast_window: int
+    sma_slow_window: int
+    lookback_minutes: int
+    atr_window: int
+    atr_multiplier: float
+    cooldown_minutes: float = 10  # no entries or exits this long after any trade
+    max_trades: int = 3           # per run: the original "per day" counter is never reset
+
+
+def pad_rows(series_list, fill=np.nan, dtype=float):
+    """Stacks 1D arrays of different lengths into one 2D array padded with fill. Returns (array, lengths)."""
+    lengths = np.array([len(s) for s in series_list], dtype=int)
+    padded = np.full((len(series_list), lengths.max() if len(lengths) else 0), fill, dtype=dtype)
+    for row, values in enumerate(series_list):
+        padded[row, :len(values)] = values
+    return padded, lengths
+
+
+class SmaBreakoutFeatures:
+    """
+    Every indicator of the 5-min SMA/ATR breakout for a batch of tickers,
+    computed once as aligned (tickers x bars) columns. Rows are each
+    ticker's own bar sequence, NaN-padded at the end. The rolling windows
+    therefore count bars, the same as the per-bar loop did.
+    """
+
+    def __init__(self, close, params):
+        close = np.atleast_2d(np.asarray(close, dtype=float))
+        frame = pd.DataFrame(close.T)
+        self.close = close
+        self.sma_fast = frame.rolling(params.sma_fast_window).mean().to_numpy().T
+        self.sma_slow = frame.rolling(params.sma_slow_window).mean().to_numpy().T
+        self.atr = frame.diff().abs().rolling(params.atr_window).mean().to_numpy().T
+        # Highest close of the lookback bars before each bar
+        self.recent_high = frame.rolling(params.lookback_minutes).max().shift(1).to_numpy().T
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            momentum = (self.sma_fast - self.sma_slow) / self.sma_slow * 100
+        self.momentum = np.where(self.sma_slow == 0, 0.0, momentum)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.qty = np.floor(params.position_size / close)
+        self.entries = (
+            (self.momentum > params.momentum_threshold) &
+            (close > self.recent_high) &
+            (self.qty > 0)
+        )
+        self.entries[:, :params.lookback_minutes] = False
+
+
+def _run_row(ns, close, features, row, n, params):
+    """Single pass over one ticker's arrays, jumping from event to event. Returns (trades, cash, qty) deltas."""
+    lookback = params.lookback_minutes
+    cooldown_ns = int(params.cooldown_minutes * 60 * 1e9)
+    hold_ns = int(params.hold_duration_minutes * 60 * 1e9)
+    candidates = np.flatnonzero(features.entries[row, lookback:n]) + lookback
+
+    trades = []
+    cash_delta = np.zeros(n)
+    qty_delta = np.zeros(n)
+    next_allowed_ns = ns[0]
+    i = lookback
+    buys = 0
+    while buys < params.max_trades:
+        start = max(i, np.searchsorted(ns, next_allowed_ns))
+        k = np.searchsorted(candidates, start)
+        if k == len(candidates):
+            break
+        entry_idx = candidates[k]
+        entry_price = close[entry_idx]
+        qty = int(features.qty[row, entry_idx])
+        cash_delta[entry_idx] -= qty * entry_price
+        qty_delta[entry_idx] += qty
+        trades.append((entry_idx, "BUY", entry_price, qty))
+        buys += 1
+        next_allowed_ns = ns[entry_idx] + cooldown_ns
+
+        # Exits are only checked once the cooldown after the buy is over
+        first = max(entry_idx + 1, np.searchsorted(ns, next_allowed_ns))
+        if first >= n:
+            break
+        prices = close[first:n]
+        change_pct = (prices - entry_price) / entry_price * 100
+        dynamic_stop_pct = -params.atr_multiplier * features.atr[row, entry_idx] / entry_price * 100
+        stop = change_pct <= dynamic_stop_pct
+        take_profit = change_pct >= params.take_profit_pct
+        sma_time = (features.sma_fast[row, first:n] < features.sma_slow[row, first:n]) & (ns[first:n] - ns[entry_idx] >= hold_ns)
+        hits = np.flatnonzero(stop | take_profit | sma_time)
+        if not hits.size:
+            break
+
+        exit_idx = first + hits[0]
+        label = EXIT_LABELS[0] if stop[hits[0]] else EXIT_LABELS[1] if take_profit[hits[0]] else EXIT_LABELS[2]
+        cash_delta[exit_idx] += qty * close[exit_idx]
+        qty_delta[exit_idx] -= qty
+        trades.append((exit_idx, label, close[exit_idx], qty))
+        next_allowed_ns = ns[exit_idx] + cooldown_ns
+        i = exit_idx + 1
+    return trades, cash_delta, qty_delta
+
+
+def run_sma_breakout_backtest(ns, close, params, lengths=None, features=None):
+    """
+    Backtests a batch of tickers. ns and close are (tickers x bars) arrays,
+    or 1D for a single ticker, padded as by pad_rows(). Returns one
+    (final_value, trades, portfolio_values) per ticker, or None when it has
+    no more bars than the lookback. portfolio_values covers bars lookback
+    onwards, and trades are (bar, action, price, shares) in order. The
+    results match the original per-bar loop.
+    """
+    ns = np.atleast_2d(ns)
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    if lengths is None:
+        lengths = np.full(len(close), close.shape[1])
+    if features is None:
+        features = SmaBreakoutFeatures(close, params)
+
+    results = []
+    for row, n in enumerate(lengths):
+        if n <= params.lookback_minutes:
+            results.append(None)
+            continue
+        trades, cash_delta, qty_delta = _run_row(ns[row, :n], close[row, :n], features, row, n, params)
+        # Cash accumulates in trade order from the starting cash, as in the loop
+        cash = np.cumsum(np.concatenate(([params.starting_cash], cash_delta)))[1:]
+        portfolio = cash + np.cumsum(qty_delta) * close[row, :n]
+        portfolio = portfolio[params.lookback_minutes:]
+        results.append((portfolio[-1], trades, portfolio))
+    return results
@@ -0,0 +1,148 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pytz
+
+eastern = pytz.timezone("US/Eastern")
+
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# One-off NYSE closures that no rule produces (national days of mourning)
+SPECIAL_CLOSURES = {
+    date(2018, 12, 5),   # President George H. W. Bush
+    date(2025, 1, 9),    # President Jimmy Carter
+}
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th given weekday of the month (n=-1 is the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous computus)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """Full-day NYSE closures in a year."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),              # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),              # Washington's Birthday
+        _easter(year) - timedelta(days=2),        # Good Friday
+        _nth_weekday(year, 5, 0, -1),             # Memorial Day
+        _observed(date(year, 7, 4)),              # Independence Day
+        _nth_weekday(year, 9, 0, 1),              # Labor Day
+        _nth_weekday(year, 11, 3, 4),             # Thanksgiving
+        _observed(date(year, 12, 25)),            # Christmas
+    }
+    # A Saturday New Year's Day is not made up on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    """1:00 PM ET closes: July 3, the day after Thanksgiving and Christmas Eve, when they are trading days."""
+    candidates = {
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    }
+    return frozenset(day for day in candidates if day.weekday() < 5 and day not in nyse_holidays(year))
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+@lru_cache(maxsize=4096)
+def session_bounds(day):
+    """(open, close) of the session on an ET calendar date as UTC datetimes, or None when the market is closed."""
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE if day in nyse_early_closes(day.year) else MARKET_CLOSE
+    return (
+        eastern.localize(datetime.combine(day, MARKET_OPEN)).astimezone(pytz.UTC),
+        eastern.localize(datetime.combine(day, close)).astimezone(pytz.UTC),
+    )
+
+
+def previous_session(day):
+    """The last trading date before `day`."""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def is_session_time(timestamp):
+    """Whether a tz-aware timestamp falls in a regular session, open and close included."""
+    # Sessions never cross midnight UTC, so an in-session time has the same UTC and ET date
+    bounds = session_bounds(timestamp.astimezone(pytz.UTC).date())
+    return bounds is not None and bounds[0] <= timestamp <= bounds[1]
+
+
+def session_table(first_day, last_day):
+    """Trading dates between two ET dates (inclusive) with their open and close as int64 UTC nanoseconds."""
+    days = [d.date() for d in pd.date_range(first_day, last_day, freq="D") if is_trading_day(d.date())]
+    opens = np.array([session_bounds(d)[0].timestamp() for d in days], dtype=np.int64) * 1_000_000_000
+    closes = np.array([session_bounds(d)[1].timestamp() for d in days], dtype=np.int64) * 1_000_000_000
+    return days, opens, closes
+
+
+def session_ids(index):
+    """
+    For a UTC DatetimeIndex, the position of each bar's session in the
+    date range the index covers, or -1 outside regular hours. The session
+    table is built once per call, so bars are located by one searchsorted
+    instead of a timezone conversion each.
+    """
+    if len(index) == 0:
+        return np.empty(0, dtype=np.int64)
+    ns = index.asi8
+    first = pd.Timestamp(ns.min(), tz="UTC").date() - timedelta(days=1)
+    last = pd.Timestamp(ns.max(), tz="UTC").date() + timedelta(days=1)
+    _, opens, closes = session_table(first, last)
+    if not len(opens):
+        return np.full(len(ns), -1, dtype=np.int64)
+
+    ids = np.searchsorted(opens, ns, side="right") - 1
+    inside = (ids >= 0) & (ns <= closes[np.maximum(ids, 0)])
+    return np.where(inside, ids, -1)
+
+
+def session_mask(index):
+    """Boolean mask of the bars of a UTC DatetimeIndex that fall in a regular session."""
+    return session_ids(index) >= 0
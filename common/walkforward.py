@@ -0,0 +1,58 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+from common.bouncebacksweep import evaluate, run_sweep, sweep_pool
+from common.parallelrunner import BACKTEST_WORKERS
+
+
+def walk_forward_windows(start, end, train_days, test_days):
+    """
+    Rolling (train_start, test_start, test_end) windows: each test slice
+    directly follows its train slice, and windows advance by test_days so
+    test slices never overlap.
+    """
+    windows = []
+    train_start = start
+    while train_start + timedelta(days=train_days + test_days) <= end:
+        test_start = train_start + timedelta(days=train_days)
+        windows.append((train_start, test_start, test_start + timedelta(days=test_days)))
+        train_start += timedelta(days=test_days)
+    return windows
+
+
+def slice_bounds(features, window_start, window_end):
+    """{ticker: (start, stop)} bar positions covering [window_start, window_end)."""
+    edges = np.array([pd.Timestamp(window_start).value, pd.Timestamp(window_end).value])
+    return {
+        ticker: tuple(int(i) for i in np.searchsorted(ticker_features.ns, edges))
+        for ticker, ticker_features in features.items()
+    }
+
+
+def run_walk_forward(features, grid, windows, workers=BACKTEST_WORKERS):
+    """
+    For each window, picks the best params from grid on the train slice and
+    scores them on the test slice. Every slice runs on the same precomputed
+    features, so indicators are built once for the whole period no matter how
+    many windows overlap. Returns one row per window.
+    """
+    results = []
+    pool = sweep_pool(features, workers) if workers > 1 and len(grid) > 1 else None
+    try:
+        for train_start, test_start, test_end in windows:
+            ranked = run_sweep(features, grid, workers, slice_bounds(features, train_start, test_start), pool)
+            best_params, train_summary = ranked[0]
+            test_summary = evaluate(best_params, features, slice_bounds(features, test_start, test_end))
+            results.append({
+                "train_start": train_start,
+                "test_start": test_start,
+                "test_end": test_end,
+                "params": best_params,
+                "train": train_summary,
+                "test": test_summary,
+            })
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
@@ -0,0 +1,108 @@
+import os
+import json
+import pandas as pd
+
+# Symbols whose last stored bar lags the freshest one by more than this (illiquid or
+# halted) are refetched with the full window, so they don't widen everyone's tail fetch
+TAIL_LAG_LIMIT = pd.Timedelta(minutes=5)
+
+# Each ticker's lookback window is kept as <WINDOW_STORE_DIR>/<SYMBOL>.parquet, with a
+# <SYMBOL>.json sidecar recording the end of the last successful fetch.
+WINDOW_STORE_DIR = os.getenv(
+    "WINDOW_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".windowstore"),
+)
+
+
+class WindowStore:
+    def __init__(self, root=WINDOW_STORE_DIR):
+        self.root = root
+
+    def _paths(self, symbol):
+        return (
+            os.path.join(self.root, f"{symbol.upper()}.parquet"),
+            os.path.join(self.root, f"{symbol.upper()}.json"),
+        )
+
+    def load(self, symbol):
+        """Returns (bars, synced_until), or (None, None) when nothing usable is stored."""
+        bars_path, meta_path = self._paths(symbol)
+        if not (os.path.exists(bars_path) and os.path.exists(meta_path)):
+            return None, None
+        try:
+            with open(meta_path) as f:
+                synced_until = pd.Timestamp(json.load(f)["synced_until"])
+            return pd.read_parquet(bars_path), synced_until
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable stored window for {symbol}: {e}")
+            return None, None
+
+    def save(self, symbol, bars, synced_until):
+        os.makedirs(self.root, exist_ok=True)
+        bars_path, meta_path = self._paths(symbol)
+        bars.to_parquet(bars_path + ".tmp")
+        os.replace(bars_path + ".tmp", bars_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"synced_until": pd.Timestamp(synced_until).isoformat()}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+class MemoryWindowStore:
+    """Same interface as WindowStore, kept in memory for long-running processes."""
+
+    def __init__(self):
+        self.windows = {}
+
+    def load(self, symbol):
+        return self.windows.get(symbol.upper(), (None, None))
+
+    def save(self, symbol, bars, synced_until):
+        self.windows[symbol.upper()] = (bars, pd.Timestamp(synced_until))
+
+
+def refresh_windows(store, fetch_batch, symbols, window_start, now):
+    """
+    Brings every symbol's stored window up to `now` and trims it to start at
+    `window_start`. Symbols whose stored window still overlaps the lookback only
+    fetch the bars since their last stored bar (re-fetched, since it may have been
+    revised), all in one batched request. Symbols with nothing stored, whose
+    last sync is older than window_start (a gap), or whose last bar lags the
+    freshest by more than TAIL_LAG_LIMIT get a full batched refetch instead.
+    fetch_batch(symbols, start, end) must return {symbol: DataFrame}.
+    """
+    window_start = pd.Timestamp(window_start)
+    stored = {}
+    full_refetch = []
+    for symbol in symbols:
+        bars, synced_until = store.load(symbol)
+        if bars is None or bars.empty or synced_until < window_start:
+            full_refetch.append(symbol)
+        else:
+            stored[symbol] = bars
+
+    if stored:
+        freshest = max(bars.index[-1] for bars in stored.values())
+        lagging = [symbol for symbol, bars in stored.items() if bars.index[-1] < freshest - TAIL_LAG_LIMIT]
+        for symbol in lagging:
+            del stored[symbol]
+        full_refetch.extend(lagging)
+
+    windows = {}
+    if stored:
+        tail_start = min(bars.index[-1] for bars in stored.values())
+        tails = fetch_batch(list(stored), tail_start, now)
+        for symbol, bars in stored.items():
+            tail = tails.get(symbol)
+            if tail is not None and not tail.empty:
+                bars = pd.concat([bars, tail])
+                bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+            windows[symbol] = bars
+
+    if full_refetch:
+        print(f"[INFO] Full window fetch for {', '.join(full_refetch)}")
+        windows.update(fetch_batch(full_refetch, window_start, now))
+
+    for symbol, bars in windows.items():
+        windows[symbol] = bars[bars.index >= window_start]
+        store.save(symbol, windows[symbol], now)
+    return windows